@@ -0,0 +1,25 @@
+import os
+import threading
+from contextlib import contextmanager
+
+# ファイルの書き込みを、読み込み中の他のスレッド・プロセスに書きかけで見せないための共通処理
+# 一時ファイルに書き終えてから本来のファイル名に置き換える（途中で例外になったら一時ファイルを消す）
+
+
+@contextmanager
+def atomic_path(path):
+    # with atomic_path(path) as tmp_path: の中でtmp_pathに書く
+    # 一時ファイル名にはプロセスIDとスレッドIDを入れ、同じファイルを同時に書いても混ざらないようにする
+    # tmp_pathを作らずに抜けたときは、元のファイルをそのまま残す
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        yield tmp_path
+        if os.path.exists(tmp_path):
+            os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
@@ -0,0 +1,145 @@
+import os
+import gzip
+import json
+import random
+
+import pandas as pd
+
+# ベンチマーク用のJ-Quants APIレスポンス
+# fixtures/ にあればそれを使い（record_fixtures.pyで実際のAPIから記録できる）、
+# なければ同じ形のデータを乱数の種を固定して作る（毎回同じ内容になる）
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+FIXTURE_PATH = os.path.join(FIXTURE_DIR, "jquants.json.gz")
+
+# 履歴の長さ別の銘柄（証券コード, 会社名, 年数）
+HISTORIES = {
+    "small": ("99910", "ベンチ小型", 2),
+    "typical": ("72030", "トヨタ自動車", 10),
+    "long": ("99930", "ベンチ長期", 25),
+}
+LISTED_COMPANIES = 4400
+END_DATE = "2024-12-30"
+# 財務データの列数を実際のAPIに近づけるための予想値などの列
+EXTRA_STATEMENT_FIELDS = [f"Forecast{i}" for i in range(70)]
+
+
+def _listing(rnd):
+    kana = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワ"
+    scales = ["TOPIX Core30", "TOPIX Large70", "TOPIX Mid400", "TOPIX Small 1", "TOPIX Small 2", "-"]
+    companies = [
+        (str(13000 + i * 10), "".join(rnd.choice(kana) for _ in range(rnd.randint(3, 8))) + rnd.choice(["", "ホールディングス", "工業", "商事"]))
+        for i in range(LISTED_COMPANIES - len(HISTORIES))
+    ]
+    companies += [(code, name) for code, name, _ in HISTORIES.values()]
+    records = []
+    for i, (code, name) in enumerate(companies):
+        sector33 = rnd.randint(1, 33)
+        records.append({
+            "Date": END_DATE,
+            "Code": code,
+            "CompanyName": name,
+            "CompanyNameEnglish": f"Company {i}",
+            "Sector17Code": str(sector33 % 17 + 1),
+            "Sector17CodeName": f"17業種{sector33 % 17 + 1}",
+            "Sector33Code": str(sector33 * 50),
+            "Sector33CodeName": f"33業種{sector33}",
+            "ScaleCategory": rnd.choice(scales),
+            "MarketCode": rnd.choice(["0111", "0112", "0113"]),
+            "MarketCodeName": "プライム",
+            "MarginCode": "1",
+            "MarginCodeName": "信用",
+        })
+    return records
+
+
+def _statements(rnd, code, years):
+    end_year = int(END_DATE[:4])
+    records = []
+    n = 0
+    for year in range(end_year - years + 1, end_year + 1):
+        sales = rnd.randint(100, 1000) * 1e8
+        shares = 100_000_000
+        for i, period in enumerate(["1Q", "2Q", "3Q", "FY"]):
+            disclosed = pd.Timestamp(f"{year - 1}-08-05") + pd.DateOffset(months=3 * i)
+            if disclosed > pd.Timestamp(END_DATE):
+                continue
+            n += 1
+            cum = sales * (i + 1) * rnd.uniform(0.9, 1.1)
+            record = {
+                "DisclosureNumber": f"{code}{n:05d}",
+                "DisclosedDate": disclosed.strftime("%Y-%m-%d"),
+                "DisclosedTime": "15:00:00",
+                "LocalCode": code,
+                "TypeOfDocument": f"{period}FinancialStatements_Consolidated_JP",
+                "TypeOfCurrentPeriod": period,
+                "CurrentPeriodStartDate": f"{year - 1}-04-01",
+                "CurrentPeriodEndDate": (pd.Timestamp(f"{year - 1}-06-30") + pd.DateOffset(months=3 * i)).strftime("%Y-%m-%d"),
+                "CurrentFiscalYearStartDate": f"{year - 1}-04-01",
+                "CurrentFiscalYearEndDate": f"{year}-03-31",
+                "NetSales": str(int(cum)),
+                "OperatingProfit": str(int(cum * rnd.uniform(0.05, 0.15))),
+                "OrdinaryProfit": str(int(cum * 0.1)),
+                "Profit": str(int(cum * 0.07)),
+                "EarningsPerShare": f"{cum * 0.07 / shares:.2f}",
+                "TotalAssets": str(int(sales * 5)),
+                "Equity": str(int(sales * 2)),
+                "EquityToAssetRatio": "0.400",
+                "BookValuePerShare": f"{sales * 2 / shares:.2f}" if period == "FY" else "",
+                "NumberOfIssuedAndOutstandingSharesAtTheEndOfFiscalYearIncludingTreasuryStock": str(shares),
+                "NumberOfTreasuryStockAtTheEndOfFiscalYear": "1000000",
+            }
+            record.update({field: str(rnd.randint(1, 10 ** 9)) for field in EXTRA_STATEMENT_FIELDS})
+            records.append(record)
+    return records
+
+
+def _daily_quotes(rnd, code, years):
+    dates = pd.bdate_range(end=END_DATE, periods=years * 250)
+    # 長い履歴には株式分割（1:2）を1回入れる
+    split_at = len(dates) // 2 if years >= 20 else None
+    price = 1000.0
+    records = []
+    for i, date in enumerate(dates):
+        factor = 1.0
+        if i == split_at:
+            factor = 0.5
+            price *= 0.5
+        price = max(10.0, price * (1 + rnd.gauss(0, 0.015)))
+        high = price * 1.01
+        low = price * 0.99
+        volume = float(rnd.randint(10_000, 1_000_000))
+        records.append({
+            "Date": date.strftime("%Y-%m-%d"), "Code": code,
+            "Open": price, "High": high, "Low": low, "Close": price,
+            "UpperLimit": "0", "LowerLimit": "0",
+            "Volume": volume, "TurnoverValue": volume * price, "AdjustmentFactor": factor,
+            "AdjustmentOpen": price, "AdjustmentHigh": high, "AdjustmentLow": low, "AdjustmentClose": price,
+            "AdjustmentVolume": volume,
+        })
+    return records
+
+
+def generate():
+    rnd = random.Random(20240101)
+    return {
+        "histories": {size: code for size, (code, _, _) in HISTORIES.items()},
+        "listed_info": _listing(rnd),
+        "statements": {code: _statements(rnd, code, years) for code, _, years in HISTORIES.values()},
+        "daily_quotes": {code: _daily_quotes(rnd, code, years) for code, _, years in HISTORIES.values()},
+    }
+
+
+def save_fixtures(fixtures, path=None):
+    path = path or FIXTURE_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with gzip.open(path + ".tmp", "wt", encoding="utf-8") as f:
+        json.dump(fixtures, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def load_fixtures(path=None):
+    path = path or FIXTURE_PATH
+    if not os.path.exists(path):
+        save_fixtures(generate(), path)
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,45 @@
+import os
+import sys
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dotenv import load_dotenv
+
+from fixtures import FIXTURE_PATH, HISTORIES, save_fixtures
+from jquants_client import JQuantsClient, TokenManager
+
+# 実際のJ-Quants APIのレスポンスを記録してベンチマーク用のfixturesを置き換える（.envの認証情報を使う）
+# 例: python benchmarks/record_fixtures.py --small 25930 --typical 72030 --long 67580
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ベンチマーク用にJ-Quants APIのレスポンスを記録する")
+    for size, (code, _, _) in HISTORIES.items():
+        parser.add_argument(f"--{size}", default=code, help=f"{size}の履歴に使う証券コード（5桁）")
+    parser.add_argument("--output", default=FIXTURE_PATH)
+    args = parser.parse_args()
+
+    load_dotenv(os.path.join(ROOT, ".env"))
+    mailaddress = os.getenv("JQUANTS_ID") or os.getenv("QUANTS_ID")
+    password = os.getenv("JQUANTS_PASSWORD") or os.getenv("PASSWORD")
+    client = JQuantsClient(TokenManager(mailaddress, password))
+
+    codes = {size: getattr(args, size) for size in HISTORIES}
+    fixtures = {
+        "histories": codes,
+        "listed_info": client.get_paginated("/listed/info", "info"),
+        "statements": {},
+        "daily_quotes": {},
+    }
+    for size, code in codes.items():
+        fixtures["statements"][code] = client.get_paginated("/fins/statements", "statements", {"code": code})
+        fixtures["daily_quotes"][code] = client.get_paginated("/prices/daily_quotes", "daily_quotes", {"code": code})
+        print(f"{size}: {code} 財務データ{len(fixtures['statements'][code])}件 / 株価{len(fixtures['daily_quotes'][code])}件")
+    save_fixtures(fixtures, args.output)
+    print(f"保存しました: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+import os
+import sys
+import gc
+import json
+import logging
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+
+import company_data
+import edinet_store
+import figures
+import http_cache
+import insight_cache
+import jquants_client
+import listing_store
+import panel_cache
+import peers
+import prefetch
+import statement_store
+import timing
+from company_data import fetch_company_data
+from company_search import CompanySearchIndex
+from fixtures import load_fixtures
+from jquants_client import JQuantsClient, TokenManager
+from price_series import RESAMPLE_RULES, price_chart_series
+from quarterly import derive_fiscal_year, derive_quarterly, prepare_statements
+from schemas import listed_info_frame, quotes_frame, statements_frame
+from stub_server import StubServer
+from valuation import valuation_series
+
+# ネットワークに出ずに、記録済みのJ-Quantsレスポンス（fixtures）とローカルのAPI代替サーバーで各処理の時間を測る
+# 使い方:
+#   python benchmarks/run.py             # baseline.jsonと比較し、遅くなっていたら終了コード1
+#   python benchmarks/run.py --save      # 今回の結果をbaseline.jsonに保存
+#   python benchmarks/run.py -k page     # 名前に"page"を含むものだけ実行
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+APP_PATH = os.path.join(ROOT, "streamlit_app.py")
+SEARCH_QUERIES = ["トヨタ", "7203", "72030", "ホールディングス", "アイ", "company 12", "ベンチ"]
+# baselineよりこの割合以上、かつMIN_REGRESSION_MS以上遅ければ劣化とみなす（数ミリ秒の揺れは無視）
+DEFAULT_TOLERANCE = 0.3
+MIN_REGRESSION_MS = 5.0
+# 画面全体（AppTest）はstreamlitの描画・スレッドの切り替えを含み、同じコードでも最小値が3割ほど揺れるので広めにする
+TOLERANCES = {"page_": 0.5}
+# 計測の揺れ（他のプロセス・CPUの周波数の変化）で劣化と誤判定しないよう、
+# 計測しない実行（WARMUP回）の後に全ベンチマークを1回ずつ測る周回をREPEAT回繰り返して最小値を使い、
+# 処理内容を変えない較正用の処理（calibration）の時間の比でbaselineを補正してから比べる
+DEFAULT_REPEAT = 9
+DEFAULT_WARMUP = 2
+CALIBRATION = "calibration"
+
+
+class Context:
+    # 各ベンチマークが使う入力（fixturesから作った型付きのDataFrame・スタブに向けたクライアント）
+    def __init__(self, fixtures, data_dir):
+        self.fixtures = fixtures
+        self.data_dir = data_dir
+        self.codes = fixtures["histories"]
+        self.listing = listed_info_frame(fixtures["listed_info"])
+        self.statements = {size: statements_frame(fixtures["statements"][code]) for size, code in self.codes.items()}
+        self.quotes = {size: quotes_frame(fixtures["daily_quotes"][code]) for size, code in self.codes.items()}
+        self.client = JQuantsClient(TokenManager("bench@example.com", "bench"))
+        self._db_count = 0
+
+    def fresh_stores(self):
+        # 財務データのローカルストア・HTTPキャッシュ・プロセス内のキャッシュを空の状態から始める（初回取得を測る）
+        self._db_count += 1
+        statement_store.DB_PATH = os.path.join(self.data_dir, f"statements-{self._db_count}.sqlite")
+        http_cache.CACHE_DIR = os.path.join(self.data_dir, f"http_cache-{self._db_count}")
+        panel_cache.PANELS_DIR = os.path.join(self.data_dir, f"panels-{self._db_count}")
+        panel_cache._cache.clear()
+        company_data._cache.clear()
+
+
+def isolate_data(data_dir):
+    # data/ 以下の実データを読み書きしないよう、保存先を一時ディレクトリに向ける
+    statement_store.DB_PATH = os.path.join(data_dir, "statements.sqlite")
+    listing_store.SNAPSHOT_PATH = os.path.join(data_dir, "listed_info.parquet")
+    timing.LOG_PATH = os.path.join(data_dir, "perf.jsonl")
+    insight_cache.CACHE_DIR = os.path.join(data_dir, "insights")
+    edinet_store.DB_PATH = os.path.join(data_dir, "edinet.sqlite")
+    peers.PEERS_DIR = os.path.join(data_dir, "peers")
+    http_cache.CACHE_DIR = os.path.join(data_dir, "http_cache")
+    panel_cache.PANELS_DIR = os.path.join(data_dir, "panels")
+    prefetch.DB_PATH = os.path.join(data_dir, "access.sqlite")
+
+
+# 各ベンチマークは準備（計測しない）をしてから、計測する処理を返す
+def bench_calibration(ctx, size):
+    # マシンの速さの目安（pandasの集計とPythonのループ、アプリのコードは使わない）
+    values = pd.Series(range(200_000), dtype="float64")
+    keys = values.astype("int64") % 97
+
+    def run():
+        values.groupby(keys).sum()
+        values.rolling(20).mean()
+        return sum(i * i for i in range(200_000))
+    return run
+
+
+def bench_search_build(ctx, size):
+    return lambda: CompanySearchIndex(ctx.listing)
+
+
+def bench_search_query(ctx, size):
+    index = CompanySearchIndex(ctx.listing)
+    return lambda: [index.search(q) for q in SEARCH_QUERIES]
+
+
+def bench_auth(ctx, size):
+    token_manager = TokenManager("bench@example.com", "bench", session=ctx.client.session)
+    return token_manager.get_id_token
+
+
+def bench_quarterly(ctx, size):
+    df_st = ctx.statements[size]
+
+    def run():
+        prepared = prepare_statements(df_st)
+        return derive_quarterly(prepared), derive_fiscal_year(prepared)
+    return run
+
+
+def bench_panels_disk(ctx, size):
+    # 保存済みのパネルを読むだけのとき（再起動後など、プロセス内のキャッシュにない場合）
+    ctx.fresh_stores()
+    code = ctx.codes[size]
+    panel_cache.load_panels(code, ctx.statements[size])
+    panel_cache._cache.clear()
+    return lambda: panel_cache.load_panels(code, ctx.statements[size])
+
+
+def bench_figures(ctx, size):
+    df_st = prepare_statements(ctx.statements[size])
+    df_q = derive_quarterly(df_st)
+    df_fy = derive_fiscal_year(df_st)
+    version = figures.statements_version(df_st)
+    code = ctx.codes[size]
+    figures._cache.clear()
+
+    def run():
+        return (
+            figures.quarterly_sales_figure(df_q, code, version, None),
+            figures.quarterly_balance_figure(df_q, code, version, None),
+            figures.fy_sales_figure(df_fy, code, version),
+            figures.fy_balance_figure(df_fy, code, version),
+        )
+    return run
+
+
+def bench_price(ctx, size):
+    df_price = ctx.quotes[size]
+    df_st = ctx.statements[size]
+    start = df_st["DisclosedDate"].min()
+
+    def run():
+        series = [price_chart_series(df_price, freq, start=start) for freq in RESAMPLE_RULES]
+        return series, valuation_series(df_price, df_st)
+    return run
+
+
+def bench_fetch(ctx, size):
+    ctx.fresh_stores()
+    code = ctx.codes[size]
+    return lambda: fetch_company_data(ctx.client, code)
+
+
+def bench_fetch_repeat(ctx, size):
+    # 同じ銘柄をもう一度表示するとき（プロセス内で共有している変換済みのDataFrameを使う）
+    ctx.fresh_stores()
+    code = ctx.codes[size]
+    fetch_company_data(ctx.client, code)
+    return lambda: fetch_company_data(ctx.client, code)
+
+
+def _page(ctx, size):
+    # 画面全体の実行（AppTest）。先頭の実行で検索インデックス・クライアントを作り、
+    # 計測対象の銘柄はキャッシュ・ローカルストアを空にした状態で選ぶ
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(APP_PATH, default_timeout=120)
+    at.run()
+    ctx.fresh_stores()
+    st.cache_data.clear()
+    figures._cache.clear()
+    at.text_input[0].set_value(ctx.codes[size])
+    return at
+
+
+def _check_page(at):
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    if at.error:
+        raise RuntimeError(at.error[0].value)
+    # 財務グラフまで描画されたこと（途中でst.stopしていない）を確かめる
+    if not any(m.value == "## 四半期" for m in at.markdown):
+        raise RuntimeError("四半期グラフが表示されませんでした")
+
+
+def bench_page_cold(ctx, size):
+    at = _page(ctx, size)
+
+    def run():
+        at.run()
+        _check_page(at)
+    return run
+
+
+def bench_page_prefetched(ctx, size):
+    # 事前取得（prefetch）が済んだ銘柄を初めて選んだとき
+    at = _page(ctx, size)
+    prefetch.warm_code(ctx.client, ctx.codes[size])
+
+    def run():
+        at.run()
+        _check_page(at)
+    return run
+
+
+def bench_page_rerun(ctx, size):
+    at = _page(ctx, size)
+    at.run()
+    _check_page(at)
+
+    def run():
+        at.run()
+        _check_page(at)
+    return run
+
+
+SIZES = ["small", "typical", "long"]
+BENCHMARKS = [("search_build", bench_search_build, [None]), ("search_query", bench_search_query, [None]), ("auth", bench_auth, [None])]
+BENCHMARKS += [
+    (name, fn, SIZES)
+    for name, fn in [
+        ("quarterly", bench_quarterly),
+        ("panels_disk", bench_panels_disk),
+        ("figures", bench_figures),
+        ("price", bench_price),
+        ("fetch", bench_fetch),
+        ("fetch_repeat", bench_fetch_repeat),
+        ("page_cold", bench_page_cold),
+        ("page_prefetched", bench_page_prefetched),
+        ("page_rerun", bench_page_rerun),
+    ]
+]
+
+
+def time_once(fn, ctx, size):
+    # 準備してから計測する処理を1回実行し、ミリ秒を返す（計測中はGCを止める）
+    target = fn(ctx, size)
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        target()
+        return (time.perf_counter() - start) * 1000
+    finally:
+        gc.enable()
+
+
+def _report(name, times):
+    print(f"{name:<24}{min(times):>10.2f} ms  (median {statistics.median(times):.2f}, max {max(times):.2f})", flush=True)
+
+
+def run_benchmarks(ctx, repeat=DEFAULT_REPEAT, pattern=None, warmup=DEFAULT_WARMUP):
+    # ベンチマークごとのミリ秒（repeat回の最小値）
+    # 1つのベンチマークをまとめてrepeat回測ると、マシンが一時的に遅い区間に全部が入ることがあるので、
+    # 全ベンチマークを1回ずつ測る周回をrepeat回繰り返す（較正用の処理も毎周測る）
+    selected = [(CALIBRATION, bench_calibration, None)]
+    for name, fn, sizes in BENCHMARKS:
+        for size in sizes:
+            full_name = f"{name}/{size}" if size else name
+            if not pattern or pattern in full_name:
+                selected.append((full_name, fn, size))
+    times = {full_name: [] for full_name, _, _ in selected}
+    for full_name, fn, size in selected:
+        for _ in range(warmup):
+            time_once(fn, ctx, size)
+    for i in range(repeat):
+        print(f"{i + 1}/{repeat}周目...", flush=True)
+        for full_name, fn, size in selected:
+            times[full_name].append(time_once(fn, ctx, size))
+    results = {}
+    for full_name, _, _ in selected:
+        results[full_name] = round(min(times[full_name]), 2)
+        _report(full_name, times[full_name])
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    # 劣化したベンチマークの (名前, 補正後のbaseline, 今回) のリスト
+    # baselineは今回と保存時の較正用の処理の時間の比で補正する（マシンが遅ければその分だけ許す）
+    scale = 1.0
+    if results.get(CALIBRATION) and baseline.get(CALIBRATION):
+        scale = results[CALIBRATION] / baseline[CALIBRATION]
+    regressions = []
+    for name, ms in results.items():
+        base = baseline.get(name)
+        if base is None or name == CALIBRATION:
+            continue
+        base *= scale
+        limit = max([tolerance] + [t for prefix, t in TOLERANCES.items() if name.startswith(prefix)])
+        if ms > base * (1 + limit) and ms - base > MIN_REGRESSION_MS:
+            regressions.append((name, base, ms))
+    return regressions
+
+
+def load_baseline(path=None):
+    path = path or BASELINE_PATH
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("results", {})
+
+
+def save_baseline(results, path=None, partial=False):
+    path = path or BASELINE_PATH
+    # -kで一部だけ実行したときは、他のベンチマークの値を残す
+    # 残した値と比べられるよう、今回の値を保存済みの較正用の処理の時間に合わせて換算する
+    previous = load_baseline(path)
+    if partial and previous.get(CALIBRATION) and results.get(CALIBRATION):
+        scale = previous[CALIBRATION] / results[CALIBRATION]
+        results = {name: round(ms * scale, 2) for name, ms in results.items() if name != CALIBRATION}
+    merged = {**previous, **results}
+    data = {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "results": dict(sorted(merged.items())),
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="記録済みのJ-Quantsレスポンスを使ったオフラインのベンチマーク")
+    parser.add_argument("--save", action="store_true", help="結果をbaseline.jsonに保存する")
+    parser.add_argument("-k", dest="pattern", help="名前にこの文字列を含むベンチマークだけ実行する")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="各ベンチマークの計測回数（最小値を使う）")
+    parser.add_argument("--warmup", type=int, default=DEFAULT_WARMUP, help="計測前に実行する回数")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="劣化とみなす割合（TOLERANCESの方が大きいものはそちらを使う）")
+    args = parser.parse_args()
+
+    # streamlitの警告ログ（非推奨・bare modeなど）で結果が埋もれないようにする
+    logging.disable(logging.WARNING)
+    # 実際の認証情報やAPIを使わない
+    os.environ["JQUANTS_ID"] = "bench@example.com"
+    os.environ["JQUANTS_PASSWORD"] = "bench"
+    # スタブ相手なのでレート制限で待たない（待ち時間を処理時間に含めない）
+    os.environ["JQUANTS_RATE_LIMIT"] = "0"
+    # バックグラウンドの事前取得は計測の邪魔になるので止める（warm系のベンチマークで直接呼ぶ）
+    os.environ["PREFETCH_TOP_N"] = "0"
+    fixtures = load_fixtures()
+    with tempfile.TemporaryDirectory(prefix="finance-bench-") as data_dir, StubServer(fixtures) as server:
+        isolate_data(data_dir)
+        jquants_client.BASE_URL = server.base_url
+        ctx = Context(fixtures, data_dir)
+        results = run_benchmarks(ctx, args.repeat, args.pattern, args.warmup)
+
+    if args.save:
+        save_baseline(results, partial=bool(args.pattern))
+        print(f"baselineを保存しました: {BASELINE_PATH}")
+        return
+    baseline = load_baseline()
+    if not baseline:
+        print("baselineがありません。--saveで保存してください。")
+        return
+    if baseline.get(CALIBRATION):
+        print(f"較正: baseline {baseline[CALIBRATION]:.2f} ms -> {results[CALIBRATION]:.2f} ms（baselineを{results[CALIBRATION] / baseline[CALIBRATION]:.2f}倍して比較）")
+    regressions = compare(results, baseline, args.tolerance)
+    for name, base, ms in regressions:
+        print(f"劣化: {name} {base:.2f} ms -> {ms:.2f} ms ({ms / base - 1:+.0%})")
+    if regressions:
+        sys.exit(1)
+    print("劣化はありません。")
+
+
+if __name__ == "__main__":
+    main()
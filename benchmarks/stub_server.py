@@ -0,0 +1,108 @@
+import json
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# ベンチマーク用のJ-Quants API代替サーバー（ローカルで記録済みのレスポンスを返す）
+# 認証（/token/*）・銘柄一覧・財務データ・日次株価に対応し、ページングとETagによる条件付きリクエストも再現する
+PAGE_SIZE = 5000
+ID_TOKEN = "bench-id-token"
+REFRESH_TOKEN = "bench-refresh-token"
+
+
+class StubServer:
+    def __init__(self, fixtures, page_size=PAGE_SIZE):
+        self.fixtures = fixtures
+        self.page_size = page_size
+        self.requests = []
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="jquants-stub", daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def records(self, path, params):
+        # (レスポンスのキー, レコードのリスト)
+        code = params.get("code")
+        date = params.get("date")
+        if path == "/v1/listed/info":
+            info = self.fixtures["listed_info"]
+            return "info", [r for r in info if r["Code"] == code] if code else info
+        if path == "/v1/fins/statements":
+            if code:
+                records = self.fixtures["statements"].get(code, [])
+            else:
+                records = [r for rs in self.fixtures["statements"].values() for r in rs]
+            return "statements", [r for r in records if r["DisclosedDate"] == date] if date else records
+        if path == "/v1/prices/daily_quotes":
+            if code:
+                records = self.fixtures["daily_quotes"].get(code, [])
+            else:
+                records = [r for rs in self.fixtures["daily_quotes"].values() for r in rs]
+            return "daily_quotes", [r for r in records if r["Date"] == date] if date else records
+        return None, None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload, etag=False):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                tag = f'"{hashlib.sha1(body).hexdigest()}"' if etag else None
+                if tag and self.headers.get("If-None-Match") == tag:
+                    status, body = 304, b""
+                self.send_response(status)
+                if tag:
+                    self.send_header("ETag", tag)
+                if body:
+                    self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                server.requests.append(("POST", url.path))
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                if url.path == "/v1/token/auth_user":
+                    return self._send(200, {"refreshToken": REFRESH_TOKEN})
+                if url.path == "/v1/token/auth_refresh":
+                    params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                    if params.get("refreshtoken") != REFRESH_TOKEN:
+                        return self._send(400, {"message": "invalid refreshtoken"})
+                    return self._send(200, {"idToken": ID_TOKEN})
+                return self._send(404, {"message": "not found"})
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                server.requests.append(("GET", url.path))
+                if self.headers.get("Authorization") != f"Bearer {ID_TOKEN}":
+                    return self._send(401, {"message": "The incoming token is invalid or expired."})
+                key, records = server.records(url.path, params)
+                if key is None:
+                    return self._send(404, {"message": "not found"})
+                start = int(params.get("pagination_key") or 0)
+                payload = {key: records[start:start + server.page_size]}
+                if start + server.page_size < len(records):
+                    payload["pagination_key"] = str(start + server.page_size)
+                return self._send(200, payload, etag=True)
+
+        return Handler
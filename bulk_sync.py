@@ -0,0 +1,68 @@
+import os
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+from jquants_client import JQuantsClient, TokenManager
+
+# 日付ごとに取得してローカルに保存する一括取得スクリプト（get_daily_quotes.py・sync_statements.py・sync_edinet.py）の共通処理
+# 取得済みの日付は各ストアに記録しておき、再実行すると未取得の日付から再開する
+
+
+def date_range_parser(description, end_help="取得終了日（YYYY-MM-DD、省略時は今日）"):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--start", required=True, help="取得開始日（YYYY-MM-DD）")
+    parser.add_argument("--end", help=end_help)
+    parser.add_argument("--workers", type=int, default=4, help="同時に取得する日数")
+    parser.add_argument("--force", action="store_true", help="取得済みの日付も取得し直す")
+    return parser
+
+
+def load_env():
+    # .envから環境変数を読み込む
+    dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
+    load_dotenv(dotenv_path)
+
+
+def jquants_bulk_client():
+    # .envの認証情報でクライアントを作る（設定されていなければ終了する）
+    # 取得結果はローカルストアに保存するので、HTTPキャッシュには入れない
+    mailaddress = os.getenv("JQUANTS_ID") or os.getenv("QUANTS_ID")
+    password = os.getenv("JQUANTS_PASSWORD") or os.getenv("PASSWORD")
+    if not mailaddress or not password:
+        print(".envにJQUANTS_IDとJQUANTS_PASSWORDを設定してください。")
+        exit(1)
+    return JQuantsClient(TokenManager(mailaddress, password), use_cache=False)
+
+
+def sync_dates(dates, done, fetch, api_error, workers, force=False, on_result=None):
+    # 未取得の日付をworkers並列でfetch(日付)し、件数を表示する。戻り値は失敗した日数
+    # api_errorの例外（status_codeを持つ）は失敗として数え、残りの日付の取得は続ける
+    # on_result(日付, 件数)は取得できた日付ごとにこのスレッドで呼ぶ（チェックポイントの保存など）
+    pending = [d for d in dates if force or d not in done]
+    print(f"対象: {len(dates)}日 / 取得済み: {len(dates) - len(pending)}日 / 残り: {len(pending)}日")
+    failed = 0
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {executor.submit(fetch, d): d for d in pending}
+        for future in as_completed(futures):
+            d = futures[future]
+            try:
+                count = future.result()
+            except api_error as e:
+                failed += 1
+                print(f"{d}: APIリクエストに失敗しました: {e.status_code}")
+                continue
+            if on_result is not None:
+                on_result(d, count)
+            print(f"{d}: {count}件")
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    return failed
+
+
+def exit_if_failed(failed):
+    if failed:
+        print(f"{failed}日分の取得に失敗しました。再実行すると未取得の日付から再開します。")
+        exit(1)
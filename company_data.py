@@ -0,0 +1,122 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+
+import http_cache
+import timing
+from figures import statements_version
+from jquants_client import JQuantsAPIError, JQuantsAuthError
+from schemas import listed_info_frame, quotes_frame
+from statement_store import connect, latest_disclosed_date, read_statements, revision, sync_statements
+from valuation import valuation_series
+
+# 1銘柄の画面表示に必要なデータを並列に取得する
+# 各リクエストは互いに依存しないので、待ち時間は一番遅いリクエスト分で済む
+EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="jquants-fetch")
+# 変換済みのDataFrame（財務データ・株価・銘柄情報・バリュエーション）はプロセス内で共有する（全セッション・事前取得のスレッド）
+# 財務データはローカルストアの内容が変わるまで、株価・銘柄情報はHTTPキャッシュと同じ有効期限（データの更新時刻）まで使う
+# 返すDataFrameは共有するので、呼び出し側では書き換えない
+MAX_CACHED_FRAMES = 256
+# 財務データの同期に失敗した銘柄は、この秒数が経つまで保存済みのデータだけで表示する（再実行のたびに再試行の待ちを繰り返さない）
+SYNC_RETRY_SECONDS = 300
+
+logger = logging.getLogger(__name__)
+_cache = OrderedDict()
+_lock = threading.Lock()
+_sync_failures = {}
+
+
+def _cached(key, version, build, expires_at=None):
+    # キャッシュにないときはbuild()の中の処理（ローカルストア・HTTPキャッシュ）がヒット/ミスを記録する
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0] == version and (entry[1] is None or time.time() < entry[1]):
+            _cache.move_to_end(key)
+            timing.count("cache_hit")
+            return entry[2]
+    frame = build()
+    with _lock:
+        _cache[key] = (version, expires_at, frame)
+        while len(_cache) > MAX_CACHED_FRAMES:
+            _cache.popitem(last=False)
+    return frame
+
+
+def _cached_response(client, path, key, code, to_frame):
+    params = {"code": code}
+    build = lambda: to_frame(client.get_paginated(path, key, params))
+    # HTTPキャッシュを使わないクライアント（一括取得）は毎回取得する
+    if not client.use_cache:
+        return build()
+    return _cached((path, str(code)), None, build, http_cache.jquants_expires_at(path, params))
+
+
+def _sync_or_keep_stored(client, code, conn):
+    # 同期に失敗しても、保存済みの開示があればそれを表示する（保存済みのものがなければ例外をそのまま送出する）
+    failed_at = _sync_failures.get(code)
+    if failed_at is not None and time.time() - failed_at < SYNC_RETRY_SECONDS and latest_disclosed_date(conn, code) is not None:
+        return
+    try:
+        sync_statements(code, client, conn=conn)
+    except (JQuantsAPIError, JQuantsAuthError, requests.RequestException) as e:
+        if latest_disclosed_date(conn, code) is None:
+            raise
+        _sync_failures[code] = time.time()
+        timing.count("sync_error")
+        logger.warning("財務データの同期に失敗したため、保存済みのデータを表示します: %s %s", code, e)
+        return
+    _sync_failures.pop(code, None)
+
+
+def fetch_statements(client, code):
+    # 差分同期してからローカルストアを読む
+    code = str(code)
+    conn = connect()
+    try:
+        _sync_or_keep_stored(client, code, conn)
+        return _cached(("statements", code), revision(conn, code), lambda: read_statements(code, conn=conn))
+    finally:
+        conn.close()
+
+
+def fetch_daily_quotes(client, code):
+    return _cached_response(client, "/prices/daily_quotes", "daily_quotes", code, quotes_frame)
+
+
+def fetch_listed_info(client, code):
+    return _cached_response(client, "/listed/info", "info", code, listed_info_frame)
+
+
+def company_valuation(code, df_price, df_st):
+    # valuation_series()の結果を、財務データの版と株価の最終日が同じ間は共有する
+    if df_price.empty or df_st.empty:
+        return valuation_series(df_price, df_st)
+    version = (statements_version(df_st), len(df_price), str(df_price["Date"].iloc[-1]))
+    return _cached(("valuation", str(code)), version, lambda: valuation_series(df_price, df_st))
+
+
+def fetch_company_data(client, code):
+    # 戻り値は (frames, errors)
+    # framesは "statements" / "daily_quotes" / "listed_info" のDataFrame
+    # APIエラー・認証エラー・通信エラーになったものはerrorsにその例外を入れ、framesは空のDataFrameにする
+    # 呼び出し元の計測（timing）にそれぞれの取得時間・受信量・行数を記録する
+    trace = timing.current_trace()
+    futures = {
+        "statements": EXECUTOR.submit(timing.traced, trace, "statements", fetch_statements, client, code),
+        "daily_quotes": EXECUTOR.submit(timing.traced, trace, "daily_quotes", fetch_daily_quotes, client, code),
+        "listed_info": EXECUTOR.submit(timing.traced, trace, "listed_info", fetch_listed_info, client, code),
+    }
+    frames = {}
+    errors = {}
+    for name, future in futures.items():
+        try:
+            frames[name] = future.result()
+        except (JQuantsAPIError, JQuantsAuthError, requests.RequestException) as e:
+            frames[name] = pd.DataFrame([])
+            errors[name] = e
+    return frames, errors
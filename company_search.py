@@ -0,0 +1,103 @@
+import unicodedata
+from collections import defaultdict
+
+# 上場銘柄一覧（/listed/info）の検索インデックス
+# 一覧の取得ごとに1回だけ作り、入力のたびにSeriesを作り直さない
+
+# ひらがな→カタカナ
+HIRA_TO_KATA = {i: i + 0x60 for i in range(0x3041, 0x3097)}
+# 規模区分（大きい会社ほど上位に表示する）
+SCALE_RANK = {
+    "TOPIX Core30": 0,
+    "TOPIX Large70": 1,
+    "TOPIX Mid400": 2,
+    "TOPIX Small 1": 3,
+    "TOPIX Small 2": 4,
+}
+
+
+def normalize(text):
+    # 全角/半角・ひらがな/カタカナ・大文字/小文字・空白の違いを吸収する
+    text = unicodedata.normalize("NFKC", str(text)).lower().translate(HIRA_TO_KATA)
+    return "".join(text.split())
+
+
+def code_to_str4(code):
+    # 5桁の証券コード（例: 70200）を4桁（7020）で表示
+    try:
+        code_int = int(float(str(code).strip()))
+        if code_int % 10 == 0 and len(str(code_int)) == 5:
+            return str(code_int)[:-1]
+        return str(code_int)
+    except Exception:
+        return str(code)
+
+
+class CompanySearchIndex:
+    def __init__(self, company_df):
+        self.company_df = company_df
+        n = len(company_df)
+        codes = company_df["Code"].astype(str).tolist() if n else []
+        names = company_df["CompanyName"].fillna("").astype(str).tolist() if n else []
+        english = company_df["CompanyNameEnglish"].fillna("").astype(str).tolist() if "CompanyNameEnglish" in company_df else [""] * n
+        scales = company_df["ScaleCategory"].tolist() if "ScaleCategory" in company_df else [None] * n
+
+        self.codes = codes
+        self._labels = {code: f"{name}（{code_to_str4(code)}）" for code, name in zip(codes, names)}
+        # 4桁・5桁どちらのコードでも完全一致で引けるようにする
+        self._exact = {}
+        for i, code in enumerate(codes):
+            self._exact.setdefault(code, i)
+            self._exact.setdefault(normalize(code_to_str4(code)), i)
+        self._names = [normalize(name) for name in names]
+        self._texts = [f"{name}\n{normalize(en)}\n{normalize(code)}" for name, en, code in zip(self._names, english, codes)]
+        self._scale = [SCALE_RANK.get(s, len(SCALE_RANK)) for s in scales]
+        # 1文字・2文字のn-gram → 該当する行番号の集合
+        grams = defaultdict(set)
+        for i, text in enumerate(self._texts):
+            for ch in set(text):
+                grams[ch].add(i)
+            for j in range(len(text) - 1):
+                gram = text[j:j + 2]
+                if "\n" not in gram:
+                    grams[gram].add(i)
+        self._grams = dict(grams)
+
+    def company_info(self, code):
+        # 銘柄一覧の該当行（業種・市場区分など）。見つからなければNone
+        i = self._exact.get(str(code))
+        return self.company_df.iloc[i] if i is not None else None
+
+    def label(self, code):
+        # 「会社名（4桁コード）」形式の表示名
+        return self._labels.get(str(code), str(code))
+
+    def search(self, query, limit=None):
+        # 関連度順に並べた証券コードのリストを返す
+        q = normalize(query)
+        if not q:
+            return []
+        exact = self._exact.get(q)
+        if exact is not None and len(q) in (4, 5):
+            return [self.codes[exact]]
+        keys = [q] if len(q) == 1 else {q[j:j + 2] for j in range(len(q) - 1)}
+        postings = [self._grams.get(key) for key in keys]
+        if any(p is None for p in postings):
+            return []
+        ids = set.intersection(*sorted(postings, key=len))
+        hits = [i for i in ids if q in self._texts[i]]
+
+        def rank(i):
+            # 完全一致 → 前方一致 → 部分一致、同順位は規模区分・一致位置・コード順
+            name = self._names[i]
+            if i == exact:
+                kind = 0
+            elif name.startswith(q) or self.codes[i].startswith(q):
+                kind = 1
+            else:
+                kind = 2
+            pos = name.find(q)
+            return (kind, self._scale[i], pos if pos >= 0 else len(name), self.codes[i])
+
+        hits.sort(key=rank)
+        return [self.codes[i] for i in hits[:limit]]
@@ -0,0 +1,77 @@
+import json
+
+from atomic_file import atomic_path
+import http_cache
+from jquants_client import REQUEST_TIMEOUT, make_session
+
+# EDINET APIの共通処理
+# v2はSubscription-Key（APIキー）が必要（.envのEDINET_API_KEYに設定する）
+BASE_URL = "https://api.edinet-fsa.go.jp/api/v2"
+
+
+class EdinetAPIError(Exception):
+    # EDINET APIがエラーを返したときに送出する
+    def __init__(self, status_code, text):
+        super().__init__(f"EDINET APIリクエストに失敗しました: {status_code}")
+        self.status_code = status_code
+        self.text = text
+
+
+class EdinetClient:
+    # use_cache=Falseにすると書類一覧をディスクキャッシュ（http_cache）に保存しない
+    def __init__(self, api_key=None, session=None, use_cache=True):
+        self.api_key = api_key
+        self.session = session or make_session()
+        self.use_cache = use_cache
+
+    def _params(self, params):
+        params = dict(params)
+        if self.api_key:
+            params["Subscription-Key"] = self.api_key
+        return params
+
+    def _get_documents(self, params, headers=None):
+        res = self.session.get(
+            f"{BASE_URL}/documents.json",
+            params=self._params(params),
+            headers=headers,
+            timeout=REQUEST_TIMEOUT,
+        )
+        if res.status_code == 304:
+            return res
+        if res.status_code != 200:
+            raise EdinetAPIError(res.status_code, res.text)
+        data = res.json()
+        # 認証エラーなどはHTTP 200のまま本文のステータスで返ってくる（キャッシュしないよう例外にする）
+        status = str(data.get("metadata", {}).get("status") or data.get("StatusCode") or "200")
+        if status != "200":
+            raise EdinetAPIError(status, res.text)
+        return res
+
+    def list_documents(self, date):
+        # 指定日に提出された書類の一覧（type=2: メタデータと書類一覧）
+        params = {"date": date, "type": 2}
+        if not self.use_cache:
+            return self._get_documents(params).json().get("results", [])
+        body = http_cache.cached_get(
+            http_cache.cache_key("edinet", "/documents.json", params),
+            http_cache.edinet_expires_at(params),
+            lambda headers: self._get_documents(params, headers),
+        )
+        return json.loads(body).get("results", [])
+
+    def download_document(self, doc_id, path):
+        # 書類のZIP（type=1: 提出本文書・XBRL）をファイルに保存する（一時ファイルに書いてから置き換える）
+        res = self.session.get(
+            f"{BASE_URL}/documents/{doc_id}",
+            params=self._params({"type": 1}),
+            timeout=REQUEST_TIMEOUT,
+            stream=True,
+        )
+        # エラー時はZIPではなくJSONが返ってくる
+        if res.status_code != 200 or "json" in res.headers.get("Content-Type", ""):
+            raise EdinetAPIError(res.status_code, res.text)
+        with atomic_path(path) as tmp_path, open(tmp_path, "wb") as f:
+            for chunk in res.iter_content(chunk_size=1024 * 1024):
+                f.write(chunk)
+        return path
@@ -0,0 +1,124 @@
+import os
+import json
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+# EDINETの書類一覧（documents.json）のローカル索引
+# 日付ごとの一覧を1回だけ取得して保存し、銘柄の書類は索引から引く（毎回オンラインで日付を遡らない）
+DB_PATH = os.path.join(os.path.dirname(__file__), "data", "edinet.sqlite")
+
+# 書類種別コード
+DOC_TYPES = {
+    "120": "有価証券報告書",
+    "130": "訂正有価証券報告書",
+    "140": "四半期報告書",
+    "150": "訂正四半期報告書",
+    "160": "半期報告書",
+    "170": "訂正半期報告書",
+}
+# 財務データを読む対象（最新の通期・期中の報告書）
+REPORT_DOC_TYPES = ["120", "140", "160"]
+
+
+def connect(db_path=None):
+    db_path = db_path or DB_PATH
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS documents ("
+        "docID TEXT PRIMARY KEY, "
+        "secCode TEXT, "
+        "edinetCode TEXT, "
+        "docTypeCode TEXT, "
+        "submitDateTime TEXT, "
+        "payload TEXT NOT NULL)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_sec ON documents(secCode, docTypeCode, submitDateTime)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_edinet ON documents(edinetCode, docTypeCode, submitDateTime)")
+    # 一覧を取得済みの提出日
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS date_sync ("
+        "date TEXT PRIMARY KEY, "
+        "synced_at TEXT NOT NULL)"
+    )
+    return conn
+
+
+def sec_code(code):
+    # EDINETのsecCodeはJ-Quantsと同じ5桁（4桁で指定されたら末尾に0を付ける）
+    code = str(code).strip()
+    return code + "0" if len(code) == 4 else code
+
+
+def save_documents(conn, results):
+    # 同じdocIDは上書き（取下げなどで一覧の内容が変わることがある）
+    rows = [
+        (r["docID"], r.get("secCode"), r.get("edinetCode"), r.get("docTypeCode"), r.get("submitDateTime"),
+         json.dumps(r, ensure_ascii=False))
+        for r in results
+        if r.get("docID")
+    ]
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?)", rows)
+    return len(rows)
+
+
+def synced_dates(conn):
+    return {r[0] for r in conn.execute("SELECT date FROM date_sync")}
+
+
+def sync_documents_by_date(date, client, conn=None, now=None):
+    # 1日分の書類一覧を取得して保存する
+    # 当日分は後から提出が増えるので、取得済みとして記録するのは前日以前だけ
+    own_conn = conn is None
+    conn = conn or connect()
+    now = now or datetime.now()
+    try:
+        saved = save_documents(conn, client.list_documents(date))
+        if date < now.strftime("%Y-%m-%d"):
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO date_sync VALUES (?, ?)", (date, now.isoformat()))
+        return saved
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def find_documents(code=None, edinet_code=None, doc_types=None, conn=None):
+    # 証券コードまたはEDINETコードで書類を探し、提出日時の新しい順に返す
+    where = []
+    args = []
+    if code is not None:
+        where.append("secCode = ?")
+        args.append(sec_code(code))
+    if edinet_code is not None:
+        where.append("edinetCode = ?")
+        args.append(edinet_code)
+    if doc_types:
+        where.append(f"docTypeCode IN ({', '.join('?' * len(doc_types))})")
+        args.extend(doc_types)
+    sql = "SELECT payload FROM documents"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY submitDateTime DESC, docID DESC"
+    own_conn = conn is None
+    conn = conn or connect()
+    try:
+        rows = conn.execute(sql, args).fetchall()
+    finally:
+        if own_conn:
+            conn.close()
+    return pd.DataFrame([json.loads(r[0]) for r in rows])
+
+
+def latest_report(code, doc_types=None, conn=None):
+    # 銘柄の最新の有価証券報告書・四半期（半期）報告書（取下げ済みは除く）。なければNone
+    df = find_documents(code=code, doc_types=doc_types or REPORT_DOC_TYPES, conn=conn)
+    if df.empty:
+        return None
+    if "withdrawalStatus" in df.columns:
+        df = df[df["withdrawalStatus"].fillna("0") == "0"]
+    return df.iloc[0].to_dict() if not df.empty else None
@@ -0,0 +1,123 @@
+import threading
+from collections import OrderedDict
+
+import timing
+
+# 財務グラフ（四半期2種・通期2種）の作成
+# 作成したFigureは（グラフ種別, 銘柄コード, 財務データの版, 表示期間）をキーにプロセス内で共有する
+# 財務データの版は statements_version() の値で、新しい開示が入ると変わる
+# plotlyは最初にグラフを作るときに読み込む（起動時間を短くするため）
+MAX_CACHED_FIGURES = 512
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def statements_version(df_st):
+    # 最新の開示日と開示件数（同じ日に追加の開示があった場合も作り直す）
+    return (str(df_st["DisclosedDate"].max()), len(df_st))
+
+
+def _cached(key, build):
+    with _lock:
+        fig = _cache.get(key)
+        if fig is not None:
+            _cache.move_to_end(key)
+            timing.count("cache_hit")
+            return fig
+    timing.count("cache_miss")
+    fig = build()
+    with _lock:
+        _cache[key] = fig
+        while len(_cache) > MAX_CACHED_FIGURES:
+            _cache.popitem(last=False)
+    return fig
+
+
+def _quarterly_sales(df_q):
+    # 売上高（単体値）・営業利益（単体値）・営業利益率（累積）のグラフ（四半期）
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=df_q["PeriodLabel"], y=df_q["NetSales_single"], name="売上高（100万円,単体）", marker_color="royalblue"))
+    fig.add_trace(go.Bar(x=df_q["PeriodLabel"], y=df_q["OperatingProfit_single"], name="営業利益（100万円,単体）", marker_color="orange"))
+    fig.add_trace(go.Scatter(x=df_q["PeriodLabel"], y=df_q["営業利益率"], name="営業利益率(%)", yaxis="y2", mode="lines+markers", marker_color="green"))
+    fig.update_layout(
+        title="売上高（単体）・営業利益（単体）・営業利益率の推移（四半期）",
+        xaxis_title="四半期",
+        yaxis=dict(title="金額（100万円）", zeroline=True, range=[0, max(df_q["NetSales_single"].max(), df_q["OperatingProfit_single"].max(), 1) * 1.1]),
+        yaxis2=dict(title="営業利益率(%)", overlaying="y", side="right", range=[0, 100], zeroline=True),
+        barmode="group"
+    )
+    return fig
+
+
+def _quarterly_balance(df_q):
+    # 総資産・純資産（累積）・自己資本比率（累積）のグラフ（四半期）
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=df_q["PeriodLabel"], y=df_q["TotalAssets"], name="総資産（100万円,累積）", marker_color="royalblue"))
+    fig.add_trace(go.Bar(x=df_q["PeriodLabel"], y=df_q["Equity"], name="純資産（100万円,累積）", marker_color="orange"))
+    fig.add_trace(go.Scatter(x=df_q["PeriodLabel"], y=df_q["自己資本比率"], name="自己資本比率(%)", yaxis="y2", mode="lines+markers", marker_color="green"))
+    fig.update_layout(
+        title="総資産（累積）・純資産（累積）・自己資本比率の推移（四半期）",
+        xaxis_title="四半期",
+        yaxis=dict(title="金額（100万円）"),
+        yaxis2=dict(title="自己資本比率(%)", overlaying="y", side="right", range=[0, 100]),
+        barmode="group"
+    )
+    return fig
+
+
+def _fy_sales(df_fy):
+    # 売上高・営業利益・営業利益率のグラフ（通期）
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=df_fy["PeriodLabel"], y=df_fy["NetSales"], name="売上高（100万円）", marker_color="royalblue"))
+    fig.add_trace(go.Bar(x=df_fy["PeriodLabel"], y=df_fy["OperatingProfit"], name="営業利益（100万円）", marker_color="orange"))
+    fig.add_trace(go.Scatter(x=df_fy["PeriodLabel"], y=df_fy["営業利益率"], name="営業利益率(%)", yaxis="y2", mode="lines+markers", marker_color="green"))
+    fig.update_layout(
+        title="売上高・営業利益・営業利益率の推移（通期）",
+        xaxis_title="通期(FY)",
+        yaxis=dict(title="金額（100万円）"),
+        yaxis2=dict(title="営業利益率(%)", overlaying="y", side="right", range=[0, 100]),
+        barmode="group"
+    )
+    return fig
+
+
+def _fy_balance(df_fy):
+    # 総資産・純資産・自己資本比率のグラフ（通期）
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=df_fy["PeriodLabel"], y=df_fy["TotalAssets"], name="総資産（100万円）", marker_color="royalblue"))
+    fig.add_trace(go.Bar(x=df_fy["PeriodLabel"], y=df_fy["Equity"], name="純資産（100万円）", marker_color="orange"))
+    fig.add_trace(go.Scatter(x=df_fy["PeriodLabel"], y=df_fy["自己資本比率"], name="自己資本比率(%)", yaxis="y2", mode="lines+markers", marker_color="green"))
+    fig.update_layout(
+        title="総資産・純資産・自己資本比率の推移（通期）",
+        xaxis_title="通期(FY)",
+        yaxis=dict(title="金額（100万円）"),
+        yaxis2=dict(title="自己資本比率(%)", overlaying="y", side="right", range=[0, 100]),
+        barmode="group"
+    )
+    return fig
+
+
+def quarterly_sales_figure(df_q, code, version, period_range):
+    # df_qは表示期間（period_range）で絞り込み済みのもの
+    return _cached(("quarterly_sales", code, version, period_range), lambda: _quarterly_sales(df_q))
+
+
+def quarterly_balance_figure(df_q, code, version, period_range):
+    return _cached(("quarterly_balance", code, version, period_range), lambda: _quarterly_balance(df_q))
+
+
+def fy_sales_figure(df_fy, code, version):
+    return _cached(("fy_sales", code, version), lambda: _fy_sales(df_fy))
+
+
+def fy_balance_figure(df_fy, code, version):
+    return _cached(("fy_balance", code, version), lambda: _fy_balance(df_fy))
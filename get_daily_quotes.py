@@ -1,45 +1,40 @@
-import os
-import requests
-import csv
-from dotenv import load_dotenv
-
-# .envから環境変数を読み込む
-dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
-load_dotenv(dotenv_path)
-ID_TOKEN = os.getenv("JQUANTS_ID_TOKEN")
-
-if not ID_TOKEN:
-    print(".envにJQUANTS_ID_TOKENが設定されていません。まずはjquants_get_token.pyで取得してください。")
-    exit(1)
-
-# 取得日付
-date = "2023-12-29"
-
-# 保存先ディレクトリ
-save_dir = os.path.join(os.path.dirname(__file__), "data")
-os.makedirs(save_dir, exist_ok=True)
-
-# APIエンドポイント
-url = f"https://api.jquants.com/v1/prices/daily_quotes?date={date}"
-headers = {
-    "Authorization": f"Bearer {ID_TOKEN}"
-}
-
-response = requests.get(url, headers=headers)
-
-if response.status_code == 200:
-    data = response.json()
-    quotes = data.get("daily_quotes", [])
-    if not quotes:
-        print("データがありません。")
-        exit(0)
-    # CSVに保存
-    csv_file = os.path.join(save_dir, f"daily_quotes_{date}.csv")
-    with open(csv_file, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=quotes[0].keys())
-        writer.writeheader()
-        writer.writerows(quotes)
-    print(f"{csv_file} に保存しました。")
-else:
-    print(f"APIリクエストに失敗しました: {response.status_code}")
-    print(response.text) 
\ No newline at end of file
+from datetime import date as date_cls
+
+import pandas as pd
+
+from bulk_sync import date_range_parser, exit_if_failed, jquants_bulk_client, load_env, sync_dates
+from jquants_client import JQuantsAPIError
+from quote_store import load_checkpoint, save_checkpoint, write_date
+
+# 全銘柄の日次株価を期間指定で取得し、日付ごとのParquetに保存する
+# 例: python get_daily_quotes.py --start 2020-01-01 --end 2023-12-29
+# 途中で止めても、再実行すればチェックポイントに記録されていない日付から再開する
+
+
+def ingest_date(client, date):
+    pages = client.iter_pages("/prices/daily_quotes", "daily_quotes", {"date": date})
+    return write_date(pages, date)
+
+
+def main():
+    parser = date_range_parser("J-Quantsの日次株価（全銘柄）をParquetに保存します", "取得終了日（YYYY-MM-DD、省略時は開始日と同じ）")
+    args = parser.parse_args()
+    load_env()
+    client = jquants_bulk_client()
+
+    dates = [d.strftime("%Y-%m-%d") for d in pd.bdate_range(args.start, args.end or args.start)]
+    done = load_checkpoint()
+    today = date_cls.today().strftime("%Y-%m-%d")
+
+    def mark_done(d, rows):
+        # 当日分は未公表の可能性があるので、データがあったときだけ取得済みにする
+        if rows or d < today:
+            done.add(d)
+            save_checkpoint(done)
+
+    failed = sync_dates(dates, done, lambda d: ingest_date(client, d), JQuantsAPIError, args.workers, args.force, mark_done)
+    exit_if_failed(failed)
+
+
+if __name__ == "__main__":
+    main()
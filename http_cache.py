@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from datetime import timedelta
+
+import lru_files
+import timing
+from atomic_file import atomic_path
+from market_calendar import is_final, next_update, now_jst
+
+# J-Quants・EDINETのGETレスポンスのディスクキャッシュ（全セッション・再起動をまたいで共有する）
+# 有効期限はデータの更新時刻に合わせる（market_calendar）。期限切れのものは、
+# ETag/Last-Modifiedがあれば条件付きリクエストで確かめ、304なら本文を取り直さずに使い続ける
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "data", "http_cache")
+# 合計サイズがこれを超えたら、最後に使われた時刻が古いものから削除する
+MAX_CACHE_BYTES = 500 * 1024 * 1024
+# 書き込みのたびにディレクトリ全体を調べないよう、この回数ごとに削除を行う
+EVICT_EVERY = 50
+# 確定したデータ（過去の日付を指定したリクエスト）の有効期限
+FINAL_TTL = timedelta(days=30)
+# EDINETの当日分の書類一覧（提出されるたびに増える）の有効期限
+EDINET_TODAY_TTL = timedelta(hours=1)
+# キーに含めないパラメータ（APIキー）
+SECRET_PARAMS = {"Subscription-Key"}
+# J-Quantsのパスごとの更新時刻（market_calendar.UPDATE_TIMESのキー）。ないパスはDEFAULT_UPDATE_TIMEで期限を決める
+JQUANTS_DATASETS = {
+    "/prices/daily_quotes": "daily_quotes",
+    "/fins/statements": "statements",
+    "/listed/info": "listed_info",
+}
+
+_writes_lock = threading.Lock()
+_writes = 0
+
+
+def cache_key(service, path, params=None):
+    params = {k: str(v) for k, v in (params or {}).items() if k not in SECRET_PARAMS}
+    payload = json.dumps({"service": service, "path": path, "params": params}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _path(key, cache_dir=None):
+    return os.path.join(cache_dir or CACHE_DIR, key[:2], f"{key}.http")
+
+
+def jquants_expires_at(path, params=None, now=None):
+    now = now or now_jst()
+    dataset = JQUANTS_DATASETS.get(path, path)
+    day = (params or {}).get("date")
+    if day and is_final(dataset, day, now):
+        return (now + FINAL_TTL).timestamp()
+    return next_update(dataset, now).timestamp()
+
+
+def edinet_expires_at(params=None, now=None):
+    # 書類一覧は過去の日付なら確定、当日分は提出のたびに増える
+    now = now or now_jst()
+    day = str((params or {}).get("date", ""))
+    if day and day < now.strftime("%Y-%m-%d"):
+        return (now + FINAL_TTL).timestamp()
+    return (now + EDINET_TODAY_TTL).timestamp()
+
+
+def lookup(key, cache_dir=None):
+    # 1行目がメタデータ（JSON）、2行目以降がレスポンスの本文
+    path = _path(key, cache_dir)
+    try:
+        with open(path, "rb") as f:
+            entry = json.loads(f.readline())
+            entry["body"] = f.read()
+    except (FileNotFoundError, ValueError):
+        return None
+    lru_files.touch(path)
+    return entry
+
+
+def store(key, entry, cache_dir=None):
+    global _writes
+    path = _path(key, cache_dir)
+    meta = {k: v for k, v in entry.items() if k != "body"}
+    with atomic_path(path) as tmp_path, open(tmp_path, "wb") as f:
+        f.write(json.dumps(meta).encode("utf-8") + b"\n")
+        f.write(entry["body"])
+    # ページのスレッド・並列取得のスレッド・事前取得のスレッドから同時に呼ばれるので、数えるのはロックの中で行う
+    with _writes_lock:
+        _writes += 1
+        due = _writes % EVICT_EVERY == 1
+    if due:
+        evict(cache_dir)
+
+
+def evict(cache_dir=None, max_bytes=MAX_CACHE_BYTES):
+    lru_files.evict(cache_dir or CACHE_DIR, ".http", max_bytes)
+
+
+def cached_get(key, expires_at, send, cache_dir=None):
+    # レスポンスの本文（bytes）を返す
+    # send(headers)はrequestsのレスポンスを返し、200・304以外は例外にする（エラーはキャッシュしない）
+    entry = lookup(key, cache_dir)
+    if entry is not None and time.time() < entry["expires_at"]:
+        timing.count("cache_hit")
+        return entry["body"]
+    headers = {}
+    if entry is not None:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    res = send(headers)
+    if res.status_code == 304 and entry is not None:
+        timing.count("cache_revalidated")
+        entry["expires_at"] = expires_at
+        store(key, entry, cache_dir)
+        return entry["body"]
+    timing.count("cache_miss")
+    body = res.content
+    store(key, {
+        "expires_at": expires_at,
+        "etag": res.headers.get("ETag"),
+        "last_modified": res.headers.get("Last-Modified"),
+        "body": body,
+    }, cache_dir)
+    return body
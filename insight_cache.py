@@ -0,0 +1,66 @@
+import os
+import json
+import hashlib
+
+import lru_files
+import timing
+from atomic_file import atomic_path
+
+# ChatGPTインサイトのディスクキャッシュ
+# (モデル, プロンプト, パラメータ)のハッシュをキーに全セッション・再起動をまたいで共有する
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "data", "insights")
+# 合計サイズがこれを超えたら、最後に使われた時刻が古いものから削除する
+MAX_CACHE_BYTES = 20 * 1024 * 1024
+
+
+def cache_key(model, messages, params):
+    payload = json.dumps({"model": model, "messages": messages, "params": params}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _path(key, cache_dir=None):
+    return os.path.join(cache_dir or CACHE_DIR, f"{key}.txt")
+
+
+def get(key, cache_dir=None):
+    path = _path(key, cache_dir)
+    try:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+    except FileNotFoundError:
+        return None
+    lru_files.touch(path)
+    return text
+
+
+def put(key, text, cache_dir=None):
+    cache_dir = cache_dir or CACHE_DIR
+    with atomic_path(_path(key, cache_dir)) as tmp_path, open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    evict(cache_dir)
+
+
+def evict(cache_dir=None, max_bytes=MAX_CACHE_BYTES):
+    lru_files.evict(cache_dir or CACHE_DIR, ".txt", max_bytes)
+
+
+def stream_insight(client, model, messages, **params):
+    # キャッシュにあればその全文を、なければChatGPTの応答を届いた順に返す
+    # 最後まで受信できた応答だけをキャッシュに保存する
+    key = cache_key(model, messages, params)
+    cached = get(key)
+    if cached is not None:
+        timing.count("cache_hit")
+        yield cached
+        return
+    timing.count("cache_miss")
+    chunks = []
+    stream = client.chat.completions.create(model=model, messages=messages, stream=True, **params)
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            chunks.append(delta)
+            yield delta
+    put(key, "".join(chunks))
@@ -0,0 +1,189 @@
+import os
+import json
+import threading
+from datetime import datetime, timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import http_cache
+import timing
+from request_scheduler import RequestScheduler
+
+# J-Quants APIの共通処理
+BASE_URL = "https://api.jquants.com/v1"
+
+# トークンの有効期限（idTokenは24時間、refreshTokenは1週間）
+ID_TOKEN_TTL = timedelta(hours=24)
+REFRESH_TOKEN_TTL = timedelta(days=7)
+# 期限切れ直前のトークンを使わないよう、この時間だけ早めに更新する
+RENEW_MARGIN = timedelta(minutes=30)
+REQUEST_TIMEOUT = 30
+# 契約プランのレート制限（1分あたりのリクエスト数）。.envのJQUANTS_RATE_LIMITで変更でき、0なら制限しない
+DEFAULT_RATE_LIMIT = 60
+# 画面の1回の表示で出す程度のリクエストは待たせずに送る
+RATE_BURST = 10
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+class JQuantsAPIError(Exception):
+    # APIが200以外を返したときに送出する（画面側でステータスと本文を表示する）
+    def __init__(self, status_code, text):
+        super().__init__(f"J-Quants APIリクエストに失敗しました: {status_code}")
+        self.status_code = status_code
+        self.text = text
+
+
+class JQuantsAuthError(Exception):
+    # refreshToken / idTokenが取得できなかったときに送出する
+    pass
+
+
+def make_session():
+    # keep-aliveで接続を使い回すセッション（TLSハンドシェイクを毎回行わない）
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def default_scheduler():
+    # プロセス内のすべてのJQuantsClient（全セッション・全スレッド）で共有する
+    # .envを読み込んだ後の最初の呼び出しで作る
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            per_minute = int(os.getenv("JQUANTS_RATE_LIMIT") or DEFAULT_RATE_LIMIT)
+            _scheduler = RequestScheduler(rate=per_minute / 60 if per_minute > 0 else None, burst=RATE_BURST)
+        return _scheduler
+
+
+class TokenManager:
+    # refreshTokenを保持し、idTokenを期限前に更新する
+    # refreshTokenも期限切れ・失効していればパスワード認証からやり直す
+    def __init__(self, mailaddress, password, session=None):
+        self.mailaddress = mailaddress
+        self.password = password
+        self.session = session or make_session()
+        self.refresh_token = None
+        self.refresh_token_expires_at = None
+        self.id_token = None
+        self.id_token_expires_at = None
+        self._lock = threading.Lock()
+
+    def _auth_user(self, now):
+        res = self.session.post(
+            f"{BASE_URL}/token/auth_user",
+            json={"mailaddress": self.mailaddress, "password": self.password},
+            timeout=REQUEST_TIMEOUT,
+        )
+        auth_data = res.json()
+        refresh_token = auth_data.get("refreshToken")
+        if not refresh_token:
+            raise JQuantsAuthError(f"refreshTokenの取得に失敗しました: {auth_data}")
+        self.refresh_token = refresh_token
+        self.refresh_token_expires_at = now + REFRESH_TOKEN_TTL
+
+    def _auth_refresh(self, now):
+        res = self.session.post(
+            f"{BASE_URL}/token/auth_refresh",
+            params={"refreshtoken": self.refresh_token},
+            timeout=REQUEST_TIMEOUT,
+        )
+        refresh_data = res.json()
+        id_token = refresh_data.get("idToken")
+        if not id_token:
+            raise JQuantsAuthError(f"idTokenの取得に失敗しました: {refresh_data}")
+        self.id_token = id_token
+        self.id_token_expires_at = now + ID_TOKEN_TTL
+
+    def _renew(self, now):
+        with timing.span("auth"):
+            if self.refresh_token and now < self.refresh_token_expires_at - RENEW_MARGIN:
+                try:
+                    self._auth_refresh(now)
+                    return
+                except JQuantsAuthError:
+                    # refreshTokenが失効していた場合はパスワード認証からやり直す
+                    pass
+            self._auth_user(now)
+            self._auth_refresh(now)
+
+    def get_id_token(self, force_refresh=False):
+        with self._lock:
+            now = datetime.now()
+            if force_refresh or not self.id_token or now >= self.id_token_expires_at - RENEW_MARGIN:
+                self._renew(now)
+            return self.id_token
+
+    def invalidate(self, id_token):
+        # 401を受けたidTokenを破棄する（他スレッドが更新済みなら何もしない）
+        with self._lock:
+            if self.id_token == id_token:
+                self.id_token = None
+
+
+class JQuantsClient:
+    # すべてのJ-Quants APIリクエストは共通のセッション・トークン管理・スケジューラを通す
+    # use_cache=Falseにするとディスクキャッシュ（http_cache）を使わない
+    # （全銘柄の一括取得は結果をローカルストアに保存するので、画面用のキャッシュを追い出さないようにする）
+    def __init__(self, token_manager, scheduler=None, use_cache=True):
+        self.token_manager = token_manager
+        self.session = token_manager.session
+        self.scheduler = scheduler or default_scheduler()
+        self.use_cache = use_cache
+
+    def get(self, path, params=None):
+        # 同じパス・パラメータのリクエストが他のセッションで実行中なら、その結果を共有する
+        key = (path, tuple(sorted((params or {}).items())))
+        return self.scheduler.coalesce(key, lambda: json.loads(self._fetch(path, params)))
+
+    def _fetch(self, path, params):
+        # ページングのある場合も1ページずつ（pagination_keyを含むパラメータで）キャッシュする
+        if not self.use_cache:
+            return self._get(path, params).content
+        return http_cache.cached_get(
+            http_cache.cache_key("jquants", path, params),
+            http_cache.jquants_expires_at(path, params),
+            lambda headers: self._get(path, params, headers),
+        )
+
+    def _get(self, path, params, headers=None):
+        # 200（条件付きリクエストなら304も）のレスポンスを返す
+        # 401のときはidTokenを更新して1回だけ再試行する
+        for attempt in range(2):
+            id_token = self.token_manager.get_id_token()
+            res = self.scheduler.send(lambda: self.session.get(
+                f"{BASE_URL}{path}",
+                headers={**(headers or {}), "Authorization": f"Bearer {id_token}"},
+                params=params,
+                timeout=REQUEST_TIMEOUT,
+            ))
+            timing.count("bytes", len(res.content))
+            if res.status_code == 401 and attempt == 0:
+                self.token_manager.invalidate(id_token)
+                continue
+            if res.status_code not in (200, 304):
+                raise JQuantsAPIError(res.status_code, res.text)
+            return res
+
+    def iter_pages(self, path, key, params=None):
+        # pagination_keyを辿り、1ページ分のレコードのリストを順に返す
+        params = dict(params or {})
+        while True:
+            data = self.get(path, params)
+            yield data.get(key, [])
+            pagination_key = data.get("pagination_key")
+            if not pagination_key:
+                return
+            params["pagination_key"] = pagination_key
+
+    def get_paginated(self, path, key, params=None):
+        # 全ページ分のレコードをまとめて取得する
+        records = []
+        for page in self.iter_pages(path, key, params):
+            records.extend(page)
+        return records
@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+from datetime import timedelta
+
+import pandas as pd
+import requests
+
+from atomic_file import atomic_path
+from jquants_client import JQuantsAPIError, JQuantsAuthError
+from market_calendar import last_update
+from schemas import listed_info_frame
+
+# 上場銘柄一覧（/listed/info）のローカルスナップショット
+# 起動時はディスクから読むだけにして、古くなったらバックグラウンドで取り直す
+SNAPSHOT_PATH = os.path.join(os.path.dirname(__file__), "data", "listed_info.parquet")
+# 取得に失敗したときに再試行するまでの間隔
+RETRY_INTERVAL = timedelta(minutes=10)
+
+_refresh_lock = threading.Lock()
+_last_attempt = 0.0
+
+
+def snapshot_version(path=None):
+    # スナップショットの更新時刻（なければNone）。検索インデックスのキャッシュキーに使う
+    try:
+        return os.stat(path or SNAPSHOT_PATH).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+def load_snapshot(path=None):
+    path = path or SNAPSHOT_PATH
+    if not os.path.exists(path):
+        return pd.DataFrame([])
+    return pd.read_parquet(path)
+
+
+def refresh_snapshot(client, path=None):
+    # APIから銘柄一覧を取得してスナップショットを置き換える（空の結果では上書きしない）
+    path = path or SNAPSHOT_PATH
+    df = listed_info_frame(client.get("/listed/info").get("info", []))
+    if df.empty:
+        return 0
+    with atomic_path(path) as tmp_path:
+        df.to_parquet(tmp_path, index=False)
+    return len(df)
+
+
+def _refresh_quietly(client, path):
+    try:
+        refresh_snapshot(client, path)
+    except (JQuantsAPIError, JQuantsAuthError, requests.RequestException, OSError):
+        # 次の再試行まで古いスナップショットを使い続ける
+        pass
+    finally:
+        _refresh_lock.release()
+
+
+def is_stale(path=None, now=None):
+    # 銘柄一覧は営業日ごとに更新されるので、直近の更新時刻（market_calendar）より前に取得したものは古い
+    version = snapshot_version(path)
+    return version is None or version < last_update("listed_info", now).timestamp()
+
+
+def refresh_in_background(client, path=None):
+    # スナップショットが古ければ別スレッドで取り直す（同時に走るのは1つだけ）
+    global _last_attempt
+    path = path or SNAPSHOT_PATH
+    if not is_stale(path):
+        return False
+    now = time.time()
+    if now - _last_attempt < RETRY_INTERVAL.total_seconds():
+        return False
+    if not _refresh_lock.acquire(blocking=False):
+        return False
+    _last_attempt = now
+    threading.Thread(target=_refresh_quietly, args=(client, path), name="listing-refresh", daemon=True).start()
+    return True
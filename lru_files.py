@@ -0,0 +1,40 @@
+import os
+import threading
+
+# ディスクキャッシュ（http_cache・insight_cache）の共通処理
+# ファイルの更新時刻を最終利用時刻として使い、合計サイズが上限を超えたら最後に使われた時刻が古いものから削除する
+
+_lock = threading.Lock()
+
+
+def touch(path):
+    # 最終利用時刻を更新する（読み込んだ後に他のスレッド・プロセスが削除していれば何もしない）
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+def evict(cache_dir, suffix, max_bytes):
+    # cache_dir以下（サブディレクトリを含む）のsuffixで終わるファイルの合計をmax_bytes以下にする
+    with _lock:
+        entries = []
+        for root, _, names in os.walk(cache_dir):
+            for name in names:
+                if not name.endswith(suffix):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
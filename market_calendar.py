@@ -0,0 +1,63 @@
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+# J-Quantsのデータが更新される時刻（日本時間・営業日のみ）
+# キャッシュやスナップショットの有効期限を「次の更新時刻まで」にするために使う
+# 祝日は営業日として扱う（余分に問い合わせるだけで、古いデータを使い続けることはない）
+JST = ZoneInfo("Asia/Tokyo")
+UPDATE_TIMES = {
+    # 株価四本値: 大引け後に当日分を公開（16:30頃）
+    "daily_quotes": time(17, 0),
+    # 財務情報: 当日の開示を18:00頃に反映
+    "statements": time(18, 30),
+    # 上場銘柄一覧: 翌営業日分を17:30頃に公開
+    "listed_info": time(18, 0),
+}
+DEFAULT_UPDATE_TIME = time(18, 0)
+# 決算発表が集中する時期（(月, 日)から(月, 日)まで、3月決算の各四半期と12月決算の本決算）
+EARNINGS_SEASONS = [((1, 20), (2, 20)), ((4, 20), (5, 20)), ((7, 20), (8, 20)), ((10, 20), (11, 20))]
+
+
+def now_jst():
+    return datetime.now(JST)
+
+
+def is_business_day(d):
+    return d.weekday() < 5
+
+
+def is_earnings_season(d):
+    return any(start <= (d.month, d.day) <= end for start, end in EARNINGS_SEASONS)
+
+
+def _update_at(d, dataset):
+    return datetime.combine(d, UPDATE_TIMES.get(dataset, DEFAULT_UPDATE_TIME), tzinfo=JST)
+
+
+def next_update(dataset, now=None):
+    # nowより後の最初の更新時刻
+    now = (now or now_jst()).astimezone(JST)
+    d = now.date()
+    while not (is_business_day(d) and _update_at(d, dataset) > now):
+        d += timedelta(days=1)
+    return _update_at(d, dataset)
+
+
+def last_update(dataset, now=None):
+    # now以前の直近の更新時刻
+    now = (now or now_jst()).astimezone(JST)
+    d = now.date()
+    while not (is_business_day(d) and _update_at(d, dataset) <= now):
+        d -= timedelta(days=1)
+    return _update_at(d, dataset)
+
+
+def is_final(dataset, day, now=None):
+    # 指定日（YYYY-MM-DD）のデータがもう変わらないか
+    # その日の翌営業日の更新が済んでいれば確定とみなす（夜間の訂正・確報も反映済み）
+    try:
+        d = date.fromisoformat(str(day))
+    except ValueError:
+        return False
+    settled = next_update(dataset, _update_at(d, dataset))
+    return (now or now_jst()) >= settled
@@ -0,0 +1,110 @@
+import os
+import glob
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pyarrow.parquet as pq
+
+import timing
+from atomic_file import atomic_path
+from figures import statements_version
+from quarterly import derive_fiscal_year, derive_quarterly, prepare_statements
+
+# 銘柄ごとの四半期・通期パネル（単体値・比率を含む）の保存
+# キーは (銘柄コード, 財務データの版)。版は statements_version() の値（最新の開示日と開示件数）で、
+# 新しい開示が入ったときだけ作り直す。プロセス内で共有し、ディスク（data/panels）にも置いて再起動後も使う
+# 返すDataFrameは全セッションで共有するので、呼び出し側では書き換えない（絞り込み・スライスだけにする）
+PANELS_DIR = os.path.join(os.path.dirname(__file__), "data", "panels")
+MAX_CACHED_PANELS = 256
+# パネルの作り方（quarterly.derive_quarterly / derive_fiscal_year・schemas.STATEMENT_SCHEMA）を変えたら上げる
+# ファイル名に含めるので、古い形式で保存されたパネルは読まずに作り直す
+PANEL_FORMAT_VERSION = 1
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _paths(code, version, panels_dir=None):
+    tag = hashlib.sha1(repr((PANEL_FORMAT_VERSION, version)).encode("utf-8")).hexdigest()[:16]
+    base = os.path.join(panels_dir or PANELS_DIR, f"{code}.{tag}")
+    return f"{base}.q.parquet", f"{base}.fy.parquet"
+
+
+def build_panels(df_st):
+    # 型付きの財務データ（schemas.statements_frame）から (四半期パネル, 通期パネル) を作る
+    df_st = prepare_statements(df_st)
+    return derive_quarterly(df_st), derive_fiscal_year(df_st)
+
+
+def _read_parquet(path):
+    # object型だった文字列列（PeriodLabelなど）はstr型で読まれるので、保存時の型情報を見てobject型に戻す
+    table = pq.read_table(path)
+    columns = json.loads(table.schema.metadata[b"pandas"])["columns"]
+    df = table.to_pandas()
+    for col in columns:
+        if col["numpy_type"] == "object" and col["name"] in df.columns:
+            df[col["name"]] = df[col["name"]].astype(object)
+    return df
+
+
+def _read(code, version, panels_dir=None):
+    q_path, fy_path = _paths(code, version, panels_dir)
+    try:
+        return _read_parquet(q_path), _read_parquet(fy_path)
+    except FileNotFoundError:
+        return None
+
+
+def _write(code, version, panels, panels_dir=None):
+    # 同じ銘柄の古い版を消してから書く（一時ファイルに書いてから置き換える）
+    paths = _paths(code, version, panels_dir)
+    for old in glob.glob(os.path.join(panels_dir or PANELS_DIR, f"{code}.*.parquet")):
+        if old not in paths:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
+    for df, path in zip(panels, paths):
+        with atomic_path(path) as tmp_path:
+            df.to_parquet(tmp_path)
+
+
+def load_panels(code, df_st, panels_dir=None):
+    # (四半期パネル, 通期パネル) を返す。メモリ → ディスクの順に探し、なければ作って保存する
+    code = str(code)
+    version = statements_version(df_st)
+    key = (code, version)
+    with _lock:
+        panels = _cache.get(key)
+        if panels is not None:
+            _cache.move_to_end(key)
+            timing.count("cache_hit")
+            return panels
+    panels = _read(code, version, panels_dir)
+    if panels is not None:
+        timing.count("cache_hit")
+    else:
+        timing.count("cache_miss")
+        panels = build_panels(df_st)
+        _write(code, version, panels, panels_dir)
+    with _lock:
+        _cache[key] = panels
+        while len(_cache) > MAX_CACHED_PANELS:
+            _cache.popitem(last=False)
+    return panels
+
+
+def period_options(df_q):
+    # 四半期スライダーの選択肢（売上高の単体値がある最初と最後の四半期の間のラベル）
+    valid_periods = df_q.dropna(subset=["NetSales_single"])["PeriodLabel"].tolist()
+    if not valid_periods:
+        return []
+    return [p for p in df_q["PeriodLabel"].dropna().unique().tolist() if valid_periods[0] <= p <= valid_periods[-1]]
+
+
+def slice_periods(df_q, start, end):
+    # パネルは期間順に並んでいるので、[start, end] の行を切り出すだけにする（共有のパネルは書き換えない）
+    row_labels = df_q["PeriodLabel"].astype(str).tolist()
+    return df_q.iloc[row_labels.index(start):row_labels.index(end) + 1]
@@ -0,0 +1,94 @@
+import os
+
+import pandas as pd
+
+from atomic_file import atomic_path
+from quarterly import KEY
+
+# 同業他社比較用の業種別統計
+# 全銘柄の四半期パネルから業種×四半期ごとの分布（四分位・中央値）と各社の業種内順位を
+# 事前に計算してParquetに保存し、企業ページはそれを読むだけにする（APIリクエストなし）
+PEERS_DIR = os.path.join(os.path.dirname(__file__), "data", "peers")
+SECTOR_COLUMNS = ["Sector33Code", "Sector17Code"]
+METRICS = ["営業利益率", "自己資本比率", "売上高成長率(YoY)"]
+
+
+def _path(name, peers_dir=None):
+    return os.path.join(peers_dir or PEERS_DIR, f"{name}.parquet")
+
+
+def build_peer_stats(df_q, company_df):
+    # df_qはscreener.market_panel()の結果
+    # 戻り値は (業種別の分布, 各社の業種内順位) のDataFrame
+    listing = company_df[["Code"] + SECTOR_COLUMNS].astype(str)
+    panel = df_q[[KEY, "PeriodLabel"] + METRICS].rename(columns={KEY: "Code"})
+    panel["Code"] = panel["Code"].astype(str)
+    panel["PeriodLabel"] = panel["PeriodLabel"].astype(str)
+    panel = panel.merge(listing, on="Code", how="inner")
+    values = panel.melt(
+        id_vars=["Code", "PeriodLabel"] + SECTOR_COLUMNS,
+        value_vars=METRICS,
+        var_name="Metric",
+        value_name="Value",
+    ).dropna(subset=["Value"])
+
+    stats = []
+    ranks = []
+    for sector_col in SECTOR_COLUMNS:
+        grouped = values.groupby([sector_col, "PeriodLabel", "Metric"])["Value"]
+        dist = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+        dist.columns = ["Q25", "Median", "Q75"]
+        dist["Count"] = grouped.size()
+        dist = dist.reset_index().rename(columns={sector_col: "SectorCode"})
+        dist.insert(0, "SectorType", sector_col)
+        stats.append(dist)
+        rank = values[["Code", "PeriodLabel", "Metric", "Value"]].copy()
+        rank.insert(0, "SectorType", sector_col)
+        rank["SectorCode"] = values[sector_col]
+        # 業種内で値が大きい順に並べたときの位置（100が最上位）
+        rank["Percentile"] = grouped.rank(pct=True) * 100
+        ranks.append(rank)
+    return pd.concat(stats, ignore_index=True), pd.concat(ranks, ignore_index=True)
+
+
+def save_peer_stats(stats, ranks, peers_dir=None):
+    peers_dir = peers_dir or PEERS_DIR
+    for name, df in [("sector_stats", stats), ("company_ranks", ranks)]:
+        with atomic_path(_path(name, peers_dir)) as tmp_path:
+            df.to_parquet(tmp_path, index=False)
+
+
+def peer_comparison(code, sector_type, sector_code, period_labels, peers_dir=None):
+    # 指定した銘柄・期間の指標を業種の分布と並べた表を返す（統計が未作成ならNone）
+    stats_path = _path("sector_stats", peers_dir)
+    ranks_path = _path("company_ranks", peers_dir)
+    if not (os.path.exists(stats_path) and os.path.exists(ranks_path)):
+        return None
+    period_labels = [str(p) for p in period_labels]
+    stats = pd.read_parquet(stats_path, filters=[
+        ("SectorType", "==", sector_type),
+        ("SectorCode", "==", str(sector_code)),
+        ("PeriodLabel", "in", period_labels),
+    ])
+    ranks = pd.read_parquet(ranks_path, filters=[
+        ("SectorType", "==", sector_type),
+        ("Code", "==", str(code)),
+        ("PeriodLabel", "in", period_labels),
+    ])
+    df = ranks[["PeriodLabel", "Metric", "Value", "Percentile"]].merge(
+        stats[["PeriodLabel", "Metric", "Q25", "Median", "Q75", "Count"]],
+        on=["PeriodLabel", "Metric"],
+        how="inner",
+    )
+    df["PeriodLabel"] = pd.Categorical(df["PeriodLabel"], categories=period_labels, ordered=True)
+    df["Metric"] = pd.Categorical(df["Metric"], categories=METRICS, ordered=True)
+    return df.sort_values(["PeriodLabel", "Metric"]).rename(columns={
+        "PeriodLabel": "四半期",
+        "Metric": "指標",
+        "Value": "自社",
+        "Percentile": "業種内順位(%)",
+        "Q25": "25%点",
+        "Median": "中央値",
+        "Q75": "75%点",
+        "Count": "社数",
+    }).reset_index(drop=True)
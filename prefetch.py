@@ -0,0 +1,186 @@
+import os
+import logging
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+
+import pandas as pd
+
+from company_data import company_valuation, fetch_company_data
+from figures import fy_sales_figure, fy_balance_figure, quarterly_sales_figure, quarterly_balance_figure, statements_version
+from jquants_client import RATE_BURST, JQuantsClient
+from market_calendar import is_earnings_season, is_final, last_update, next_update, now_jst
+from panel_cache import load_panels, period_options, slice_periods
+from quote_store import load_checkpoint, save_checkpoint, write_date
+from statement_store import sync_statements_by_date
+
+# よく見られる銘柄の事前取得（バックグラウンドのスレッド）
+# 銘柄ごとの表示回数を記録し、データの更新時刻（大引け後・開示の反映後）を過ぎるたびに
+# - 日次株価の差分（前回取得した日の翌営業日から当日まで、全銘柄）をローカルストアに追加する
+# - 決算発表の時期は当日の開示（全銘柄）を取得する
+# - 表示回数の多い上位の銘柄について、画面と同じデータ取得・パネル・グラフを作っておく
+# 画面を開いたときには、取得・変換済みのデータ・バリュエーション・パネル・グラフのキャッシュから読むだけになる
+DB_PATH = os.path.join(os.path.dirname(__file__), "data", "access.sqlite")
+# 表示回数を数える期間
+ACCESS_WINDOW = timedelta(days=14)
+# 事前取得する銘柄数（.envのPREFETCH_TOP_Nで変更でき、0なら事前取得しない）
+DEFAULT_TOP_N = 20
+# プロセスの起動直後は画面の表示のリクエストが集中するので、最初の事前取得はこの秒数だけ待ってから行う
+FIRST_RUN_DELAY = 60
+# 画面の表示のリクエストがすぐ送れるよう、レート制限のトークンをこの数だけ残して送る
+RATE_RESERVE = RATE_BURST // 2
+# 決算発表の時期は開示が多いので、この間隔でも取り直す
+SEASON_INTERVAL = timedelta(minutes=30)
+# 失敗したときに再試行するまでの間隔
+RETRY_INTERVAL = timedelta(minutes=10)
+
+logger = logging.getLogger(__name__)
+_start_lock = threading.Lock()
+_worker = None
+
+
+def connect(db_path=None):
+    db_path = db_path or DB_PATH
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS access ("
+        "Code TEXT NOT NULL, "
+        "Day TEXT NOT NULL, "
+        "views INTEGER NOT NULL, "
+        "PRIMARY KEY (Code, Day))"
+    )
+    return conn
+
+
+def record_access(code, now=None, db_path=None):
+    # 銘柄の表示を1回記録する（日ごとに集計）
+    day = (now or now_jst()).strftime("%Y-%m-%d")
+    conn = connect(db_path)
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO access VALUES (?, ?, 1) ON CONFLICT(Code, Day) DO UPDATE SET views = views + 1",
+                (str(code), day),
+            )
+    finally:
+        conn.close()
+
+
+def top_codes(n, now=None, db_path=None):
+    # 直近ACCESS_WINDOWの表示回数が多い順の銘柄コード
+    since = ((now or now_jst()) - ACCESS_WINDOW).strftime("%Y-%m-%d")
+    conn = connect(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT Code FROM access WHERE Day > ? GROUP BY Code ORDER BY SUM(views) DESC, Code LIMIT ?",
+            (since, n),
+        ).fetchall()
+    finally:
+        conn.close()
+    return [r[0] for r in rows]
+
+
+def sync_quote_deltas(client, now=None, base_dir=None):
+    # 日次株価のローカルストア（get_daily_quotes.pyで作成）に、取得済みの最後の日より後の営業日を追加する
+    # ストアがまだなければ何もしない。戻り値は追加した行数
+    done = load_checkpoint(base_dir)
+    if not done:
+        return 0
+    # 大引け後の公開が済んだ最後の営業日まで
+    latest = last_update("daily_quotes", now).date()
+    rows = 0
+    for day in pd.bdate_range(pd.Timestamp(max(done)) + pd.Timedelta(days=1), latest):
+        date = day.strftime("%Y-%m-%d")
+        day_rows = write_date(client.iter_pages("/prices/daily_quotes", "daily_quotes", {"date": date}), date, base_dir)
+        rows += day_rows
+        # 公開が遅れて空だった日は、確定する（翌営業日の更新が済む）まで取得済みにせず次回も取得する
+        if day_rows or is_final("daily_quotes", date, now):
+            done.add(date)
+            save_checkpoint(done, base_dir)
+    return rows
+
+
+def warm_code(client, code):
+    # 画面で銘柄を選んだときと同じ取得・パネル・グラフ（スライダーの初期範囲）を作っておく
+    frames, errors = fetch_company_data(client, code)
+    df_st = frames["statements"]
+    if errors.get("statements") is not None or df_st.empty:
+        return False
+    if errors.get("daily_quotes") is None:
+        company_valuation(code, frames["daily_quotes"], df_st)
+    df_q, df_fy = load_panels(code, df_st)
+    st_version = statements_version(df_st)
+    if not df_q.empty:
+        period_labels = period_options(df_q)
+        if len(period_labels) >= 2:
+            period_range = (period_labels[0], period_labels[-1])
+            df_q_filtered = slice_periods(df_q, *period_range)
+        else:
+            period_range = None
+            df_q_filtered = df_q
+        quarterly_sales_figure(df_q_filtered, code, st_version, period_range)
+        quarterly_balance_figure(df_q_filtered, code, st_version, period_range)
+        if not df_fy.empty:
+            fy_sales_figure(df_fy, code, st_version)
+            fy_balance_figure(df_fy, code, st_version)
+    return True
+
+
+def run_cycle(client, top_n, now=None):
+    # 1回分の事前取得。戻り値は事前取得した銘柄コード
+    now = now or now_jst()
+    # 全銘柄分の取得は結果をローカルストアに保存するので、HTTPキャッシュには入れない
+    bulk_client = JQuantsClient(client.token_manager, client.scheduler, use_cache=False)
+    sync_quote_deltas(bulk_client, now)
+    if is_earnings_season(now.date()):
+        sync_statements_by_date(now.strftime("%Y-%m-%d"), bulk_client)
+    codes = top_codes(top_n, now)
+    for code in codes:
+        # 1銘柄の失敗（データの不備など）で残りの銘柄の事前取得を止めない
+        try:
+            warm_code(client, code)
+        except Exception:
+            logger.exception("事前取得に失敗しました: %s", code)
+    return codes
+
+
+def next_run(now=None):
+    # 次にデータが更新される時刻（決算発表の時期はSEASON_INTERVAL後も）
+    now = now or now_jst()
+    wake = min(next_update("daily_quotes", now), next_update("statements", now))
+    if is_earnings_season(now.date()):
+        wake = min(wake, now + SEASON_INTERVAL)
+    return wake
+
+
+def _run_forever(client, top_n):
+    time.sleep(FIRST_RUN_DELAY)
+    while True:
+        try:
+            run_cycle(client, top_n)
+            wait = (next_run() - now_jst()).total_seconds()
+        except Exception:
+            # どんな例外でもスレッドを終わらせない（終わるとプロセスが動いている間は再開されない）
+            logger.exception("事前取得に失敗しました。%d分後に再試行します", RETRY_INTERVAL.total_seconds() // 60)
+            wait = RETRY_INTERVAL.total_seconds()
+        time.sleep(max(wait, 1))
+
+
+def start_in_background(client, top_n=None):
+    # 事前取得のスレッドをプロセスに1つだけ起動する（起動からFIRST_RUN_DELAY秒後にも1回実行してキャッシュを温める）
+    # 画面と同じ認証・レート制限の枠を使うが、トークンをRATE_RESERVE個残して送る
+    global _worker
+    if top_n is None:
+        top_n = int(os.getenv("PREFETCH_TOP_N") or DEFAULT_TOP_N)
+    if top_n <= 0:
+        return False
+    with _start_lock:
+        if _worker is not None:
+            return False
+        worker_client = JQuantsClient(client.token_manager, client.scheduler.background(RATE_RESERVE))
+        _worker = threading.Thread(target=_run_forever, args=(worker_client, top_n), name="prefetch", daemon=True)
+        _worker.start()
+    return True
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+# 株価グラフ用の系列作成（期間の切り出し・週足/月足への変換・間引き）
+# 履歴の長さに関わらず、ブラウザに送る点数をMAX_PRICE_POINTS以下に抑える
+MAX_PRICE_POINTS = 500
+RESAMPLE_RULES = {"日足": None, "週足": "W-FRI", "月足": "ME"}
+# PER・PBRのグラフは週末時点の値で描き、点数がMAX_PRICE_POINTSを超える期間は月末・四半期末時点にする
+VALUATION_RULES = ["W-FRI", "ME", "QE"]
+OHLC_AGG = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+
+
+def clip_window(df_price, start=None, end=None):
+    # 日付順に並んだ株価から [start, end] の範囲を二分探索で切り出す
+    dates = df_price["Date"].to_numpy()
+    lo = np.searchsorted(dates, np.datetime64(pd.Timestamp(start)), side="left") if start is not None else 0
+    hi = np.searchsorted(dates, np.datetime64(pd.Timestamp(end)), side="right") if end is not None else len(dates)
+    return df_price.iloc[lo:hi]
+
+
+def resample_ohlc(df_price, rule):
+    # 日足を週足（W-FRI）・月足（ME）の四本値に変換する（日付は期間の末日）
+    agg = {col: how for col, how in OHLC_AGG.items() if col in df_price.columns}
+    df = df_price.set_index("Date")[list(agg)].resample(rule).agg(agg)
+    return df.dropna(subset=["Close"]).reset_index()
+
+
+def lttb(x, y, n_out):
+    # Largest-Triangle-Three-Buckets法で形を保ったまま間引き、残す点の位置を返す
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    # 先頭と末尾は必ず残し、間の点をn_out-2個のバケットに分ける
+    edges = np.append(np.linspace(1, n - 1, n_out - 1).astype(np.int64), n)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0] = 0
+    idx[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2]
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        idx[i + 1] = a
+    return idx
+
+
+def price_chart_series(df_price, freq="日足", start=None, end=None, max_points=MAX_PRICE_POINTS):
+    # 表示期間・表示単位に合わせた終値の系列（日付のインデックス付き）を返す
+    df = clip_window(df_price, start, end)
+    rule = RESAMPLE_RULES[freq]
+    if rule:
+        df = resample_ohlc(df, rule)
+    series = df.set_index("Date")["Close"].dropna()
+    if len(series) > max_points:
+        series = series.iloc[lttb(series.index.asi8, series.to_numpy(), max_points)]
+    return series
+
+
+def valuation_chart_frame(df_val, start=None, end=None, max_points=MAX_PRICE_POINTS):
+    # 表示期間のPER・PBR（日付のインデックス付き）を、点数がmax_points以下になる一番細かい間隔の期末値で返す
+    df = clip_window(df_val, start, end).set_index("Date")[["PER", "PBR"]]
+    for rule in VALUATION_RULES:
+        points = df.resample(rule).last()
+        if len(points) <= max_points:
+            break
+    return points
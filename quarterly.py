@@ -0,0 +1,97 @@
+import pandas as pd
+
+# 財務諸表から四半期・通期パネルを作る（複数銘柄をまとめて処理できる）
+# パネルの列・値の作り方を変えたら、保存済みのパネルを作り直すようpanel_cache.PANEL_FORMAT_VERSIONを上げる
+QUARTERS = ["1Q", "2Q", "3Q", "4Q"]
+FY_PERIODS = ["FY", "通期"]
+# 四半期パネルの元にする開示種別（4Qは通期の開示から作る）
+QUARTER_SOURCE = {"1Q": "1Q", "2Q": "2Q", "3Q": "3Q", "FY": "4Q", "通期": "4Q"}
+KEY = "LocalCode"
+
+
+def make_period_labels(df_st):
+    # 「2024/FY」「2024/1Q」形式のラベル（年はCurrentFiscalYearEndDateの年）
+    year = df_st["CurrentFiscalYearEndDate"].dt.year
+    period = df_st["TypeOfCurrentPeriod"].astype("string").fillna("")
+    is_fy = period.str.contains("FY", regex=False) | period.str.contains("通期", regex=False) | (period == "")
+    q = period.str.replace("Quarter", "Q", regex=False).where(~is_fy, "FY")
+    labels = year.astype("Int64").astype(str) + "/" + q
+    return labels.astype(object).where(year.notna(), None)
+
+
+def prepare_statements(df_st):
+    # 型付きの財務データ（schemas.statements_frame）にラベルを付けて並べ替える
+    df_st = df_st[df_st["DisclosedDate"].notnull()].copy()
+    df_st["PeriodLabel"] = make_period_labels(df_st)
+    return df_st.sort_values(["CurrentFiscalYearEndDate", "TypeOfCurrentPeriod"])
+
+
+def _period_order(years):
+    return [f"{year}/{q}" for year in sorted(years) for q in QUARTERS]
+
+
+def derive_quarterly(df_st):
+    # prepare_statements済みのDataFrameから四半期パネルを作る
+    # 各年度×四半期を1行とし、同じ年度・種別の開示がちょうど1件のときだけ値を入れる
+    # （4Qは通期と3Qがそろうときだけ通期の開示から作る）
+    df = df_st[df_st["CurrentFiscalYearEndDate"].notna()].copy()
+    df["_year"] = df["CurrentFiscalYearEndDate"].dt.year.astype(int)
+    df["_quarter"] = df["TypeOfCurrentPeriod"].astype(object).map(QUARTER_SOURCE)
+    keys = [KEY, "_year"]
+    grid = df[keys].drop_duplicates().merge(pd.DataFrame({"_quarter": QUARTERS}), how="cross")
+
+    src = df[df["_quarter"].notna()]
+    counts = src.groupby(keys + ["_quarter"], observed=True)["_quarter"].transform("size")
+    uniq = src[counts == 1]
+    idx = pd.MultiIndex.from_frame(uniq[keys])
+    has_q3 = idx.isin(idx[(uniq["_quarter"] == "3Q").to_numpy()])
+    rows = uniq[(uniq["_quarter"] != "4Q").to_numpy() | has_q3].copy()
+
+    # 累積売上高を年度×四半期に並べ、前四半期との差分で単体値を出す
+    cum = rows.pivot(index=keys, columns="_quarter", values="NetSales").reindex(columns=QUARTERS)
+    single = cum.diff(axis=1)
+    single["1Q"] = cum["1Q"]
+    # 通期 − 3Q が負になる場合は欠損にする
+    single["4Q"] = single["4Q"].where(cum["3Q"] <= cum["4Q"])
+    single = single.reset_index().melt(id_vars=keys, var_name="_quarter", value_name="NetSales_single")
+    rows = rows.merge(single, on=keys + ["_quarter"], how="left")
+
+    value_cols = [c for c in rows.columns if c not in keys + ["_quarter"]]
+    df_q = grid.merge(rows[keys + ["_quarter"] + value_cols], on=keys + ["_quarter"], how="left")
+    df_q["TypeOfCurrentPeriod"] = df_q["_quarter"]
+    df_q["PeriodLabel"] = pd.Categorical(
+        df_q["_year"].astype(str) + "/" + df_q["_quarter"],
+        categories=_period_order(df_q["_year"].unique()),
+        ordered=True,
+    )
+    df_q = df_q.sort_values([KEY, "PeriodLabel"])
+    df_q = df_q[list(df_st.columns) + ["NetSales_single"]].reset_index(drop=True)
+
+    # 100万円単位
+    df_q["NetSales_single"] = df_q["NetSales_single"] / 1e6
+    df_q["NetSales"] = df_q["NetSales"] / 1e6
+    df_q["OperatingProfit"] = df_q["OperatingProfit"] / 1e6
+    df_q["営業利益率"] = df_q["OperatingProfit"] / df_q["NetSales"] * 100
+    df_q["TotalAssets"] = df_q["TotalAssets"] / 1e6
+    df_q["Equity"] = df_q["Equity"] / 1e6
+    df_q["自己資本比率"] = df_q["Equity"] / df_q["TotalAssets"] * 100
+    # 各期間の単体値（銘柄ごとに直前の行との差分）
+    by_code = df_q.groupby(KEY, sort=False, observed=True)
+    for col in ["OperatingProfit", "TotalAssets", "Equity"]:
+        df_q[f"{col}_single"] = by_code[col].diff().fillna(df_q[col])
+    return df_q
+
+
+def derive_fiscal_year(df_st):
+    # 通期（FY/通期）の開示だけを開示日順に並べ、100万円単位に変換する
+    df_fy = df_st[df_st["TypeOfCurrentPeriod"].isin(FY_PERIODS)].copy()
+    if df_fy.empty:
+        return df_fy
+    df_fy = df_fy.sort_values("DisclosedDate")
+    df_fy["NetSales"] = df_fy["NetSales"] / 1e6
+    df_fy["OperatingProfit"] = df_fy["OperatingProfit"] / 1e6
+    df_fy["営業利益率"] = df_fy["OperatingProfit"] / df_fy["NetSales"] * 100
+    df_fy["TotalAssets"] = df_fy["TotalAssets"] / 1e6
+    df_fy["Equity"] = df_fy["Equity"] / 1e6
+    df_fy["自己資本比率"] = df_fy["Equity"] / df_fy["TotalAssets"] * 100
+    return df_fy
@@ -0,0 +1,80 @@
+import os
+import json
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from atomic_file import atomic_path
+from schemas import QUOTE_NUMERIC_COLUMNS
+
+# 全銘柄の日次株価（/prices/daily_quotes?date=）のローカルストア
+# 1営業日を1ファイル（data/daily_quotes/年/日付.parquet）として保存する
+QUOTES_DIR = os.path.join(os.path.dirname(__file__), "data", "daily_quotes")
+CHECKPOINT_NAME = "_checkpoint.json"
+
+QUOTE_SCHEMA = pa.schema(
+    [("Date", pa.date32()), ("Code", pa.string())]
+    + [(col, pa.float64()) for col in QUOTE_NUMERIC_COLUMNS]
+)
+
+
+def partition_path(date, base_dir=None):
+    date = pd.Timestamp(date).strftime("%Y-%m-%d")
+    return os.path.join(base_dir or QUOTES_DIR, date[:4], f"{date}.parquet")
+
+
+def _page_table(records):
+    df = pd.DataFrame(records).reindex(columns=QUOTE_SCHEMA.names)
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce").dt.date
+    for col in QUOTE_NUMERIC_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    return pa.Table.from_pandas(df, schema=QUOTE_SCHEMA, preserve_index=False)
+
+
+def write_date(pages, date, base_dir=None):
+    # ページごとに受け取ったレコードをそのままParquetに追記する（全件をメモリに持たない）
+    # 書き込みが最後まで終わったときだけ本来のファイル名に置き換える（1件もなければファイルを作らない）
+    writer = None
+    rows = 0
+    with atomic_path(partition_path(date, base_dir)) as tmp_path:
+        try:
+            for records in pages:
+                if not records:
+                    continue
+                table = _page_table(records)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, QUOTE_SCHEMA, compression="zstd")
+                writer.write_table(table)
+                rows += table.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+    return rows
+
+
+def load_checkpoint(base_dir=None):
+    # 取得済み（データなしの休場日を含む）の日付の集合
+    path = os.path.join(base_dir or QUOTES_DIR, CHECKPOINT_NAME)
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return set(json.load(f).get("done", []))
+
+
+def save_checkpoint(done, base_dir=None):
+    path = os.path.join(base_dir or QUOTES_DIR, CHECKPOINT_NAME)
+    with atomic_path(path) as tmp_path, open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"done": sorted(done)}, f)
+
+
+def read_daily_quotes(start, end, codes=None, base_dir=None):
+    # 期間内の日付ファイルだけを読む（codesを指定すると該当銘柄の行だけを読み込む）
+    files = [partition_path(d, base_dir) for d in pd.bdate_range(start, end)]
+    files = [f for f in files if os.path.exists(f)]
+    if not files:
+        return QUOTE_SCHEMA.empty_table().to_pandas()
+    filters = [("Code", "in", [str(c) for c in codes])] if codes is not None else None
+    df = pq.read_table(files, schema=QUOTE_SCHEMA, filters=filters).to_pandas()
+    df["Date"] = pd.to_datetime(df["Date"])
+    return df
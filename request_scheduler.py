@@ -0,0 +1,115 @@
+import random
+import threading
+import time
+
+import timing
+
+# プロセス内で共有するAPIリクエストの調整役
+# - 同じリクエストが同時に来たら1回だけ送り、結果を全員で使う（single-flight）
+# - トークンバケットで送信ペースを契約プランの上限以下に抑える
+# - 429・5xxは指数バックオフ（Retry-Afterがあればそれに従う）で再試行する
+RETRY_STATUS = {429, 500, 502, 503, 504}
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0
+MAX_BACKOFF = 30.0
+
+
+class TokenBucket:
+    # 1秒あたりrate個のトークンが貯まり（最大burst個）、1リクエストごとに1個使う
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, reserve=0):
+        # トークンが貯まるまで待ち、待った秒数を返す
+        # reserveを指定すると、使った後にもreserve個（最大burst-1個）残るときだけ使う
+        need = 1 + min(reserve, self.burst - 1)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= need:
+                    self.tokens -= 1
+                    return waited
+                wait = (need - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RequestScheduler:
+    def __init__(self, rate=None, burst=1, max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, max_backoff=MAX_BACKOFF,
+                 bucket=None, reserve=0):
+        # rateは1秒あたりのリクエスト数（Noneなら制限しない）
+        # bucketを渡すと他のRequestSchedulerとトークンバケットを共有し、バケットにreserve個のトークンを残して送る
+        self.bucket = bucket or (TokenBucket(rate, burst) if rate else None)
+        self.reserve = reserve
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def background(self, reserve):
+        # バックグラウンドの取得用。同じトークンバケットで送るが、reserve個のトークンを残すように待つ
+        # 同じリクエストの共有はしない（このスケジューラの待ちに、他のリクエストを付き合わせない）
+        return RequestScheduler(
+            max_retries=self.max_retries, backoff_base=self.backoff_base, max_backoff=self.max_backoff,
+            bucket=self.bucket, reserve=reserve,
+        )
+
+    def coalesce(self, key, fn):
+        # 同じkeyの処理が実行中なら、その結果（例外も）を待って返す
+        # 結果は呼び出し元の間で共有されるので、書き換えずに使う
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            timing.count("coalesced")
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _backoff(self, attempt, res):
+        retry_after = res.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return min(self.max_backoff, float(retry_after))
+        # 同時に失敗したリクエストが同じ時刻に再送しないよう揺らぎを入れる
+        return min(self.max_backoff, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def send(self, fn):
+        # fn（requestsのレスポンスを返す）を送信ペースに合わせて呼び、429・5xxなら待って再試行する
+        for attempt in range(self.max_retries + 1):
+            if self.bucket is not None:
+                waited = self.bucket.acquire(self.reserve)
+                if waited:
+                    timing.count("throttled_ms", round(waited * 1000))
+            res = fn()
+            if res.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                return res
+            timing.count("retries")
+            time.sleep(self._backoff(attempt, res))
@@ -0,0 +1,91 @@
+import pandas as pd
+
+# J-Quants APIのレスポンスをDataFrameにするときの列と型
+# 使う列だけを残し、数値・日付・区分の変換はここで一度だけ行う（以降の処理では文字列からの変換をしない）
+# 型: "datetime" 日付 / "float64" 金額・比率 / "Int64" 株数 / "category" コード・区分 / "string" その他の文字列
+
+# /fins/statements（列・型を変えたら、保存済みのパネルを作り直すようpanel_cache.PANEL_FORMAT_VERSIONを上げる）
+STATEMENT_SCHEMA = {
+    "DisclosureNumber": "string",
+    "DisclosedDate": "datetime",
+    "DisclosedTime": "string",
+    "LocalCode": "category",
+    "TypeOfDocument": "category",
+    "TypeOfCurrentPeriod": "category",
+    "CurrentPeriodStartDate": "datetime",
+    "CurrentPeriodEndDate": "datetime",
+    "CurrentFiscalYearStartDate": "datetime",
+    "CurrentFiscalYearEndDate": "datetime",
+    "NetSales": "float64",
+    "OperatingProfit": "float64",
+    "OrdinaryProfit": "float64",
+    "Profit": "float64",
+    "EarningsPerShare": "float64",
+    "TotalAssets": "float64",
+    "Equity": "float64",
+    "EquityToAssetRatio": "float64",
+    "BookValuePerShare": "float64",
+    "CashFlowsFromOperatingActivities": "float64",
+    "CashFlowsFromInvestingActivities": "float64",
+    "CashFlowsFromFinancingActivities": "float64",
+    "CashAndEquivalents": "float64",
+    "NumberOfIssuedAndOutstandingSharesAtTheEndOfFiscalYearIncludingTreasuryStock": "Int64",
+    "NumberOfTreasuryStockAtTheEndOfFiscalYear": "Int64",
+}
+
+# /prices/daily_quotes
+QUOTE_NUMERIC_COLUMNS = [
+    "Open", "High", "Low", "Close", "UpperLimit", "LowerLimit", "Volume", "TurnoverValue",
+    "AdjustmentFactor", "AdjustmentOpen", "AdjustmentHigh", "AdjustmentLow", "AdjustmentClose",
+    "AdjustmentVolume",
+]
+QUOTE_SCHEMA = {"Date": "datetime", "Code": "category"} | dict.fromkeys(QUOTE_NUMERIC_COLUMNS, "float64")
+
+# /listed/info
+LISTED_INFO_SCHEMA = {
+    "Date": "datetime",
+    "Code": "string",
+    "CompanyName": "string",
+    "CompanyNameEnglish": "string",
+    "Sector17Code": "category",
+    "Sector17CodeName": "category",
+    "Sector33Code": "category",
+    "Sector33CodeName": "category",
+    "ScaleCategory": "category",
+    "MarketCode": "category",
+    "MarketCodeName": "category",
+}
+
+
+def _convert(col, kind):
+    if kind == "datetime":
+        return pd.to_datetime(col, errors="coerce")
+    if kind in ("float64", "Int64"):
+        return pd.to_numeric(col, errors="coerce").astype(kind)
+    return col.astype(kind)
+
+
+def apply_schema(records, schema):
+    # レコードのリストを型付きのDataFrameにする（スキーマにない列は捨て、足りない列は欠損で補う）
+    df = pd.DataFrame(records)
+    if df.empty:
+        return df
+    df = df.reindex(columns=list(schema))
+    for name, kind in schema.items():
+        df[name] = _convert(df[name], kind)
+    return df
+
+
+def statements_frame(records):
+    return apply_schema(records, STATEMENT_SCHEMA)
+
+
+def quotes_frame(records):
+    df = apply_schema(records, QUOTE_SCHEMA)
+    if df.empty:
+        return df
+    return df.sort_values("Date").reset_index(drop=True)
+
+
+def listed_info_frame(records):
+    return apply_schema(records, LISTED_INFO_SCHEMA)
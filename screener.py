@@ -0,0 +1,58 @@
+import pandas as pd
+
+from quarterly import KEY, prepare_statements, derive_quarterly
+
+# 全銘柄の財務指標を一括で計算するスクリーニング
+# 銘柄ごとのループやAPIリクエストは行わず、全銘柄の財務データをまとめて処理する
+LISTING_COLUMNS = ["Code", "CompanyName", "Sector17Code", "Sector17CodeName", "Sector33Code", "Sector33CodeName", "MarketCode", "MarketCodeName"]
+SCREENER_COLUMNS = [
+    "Code", "CompanyName", "PeriodLabel", "DisclosedDate",
+    "NetSales_single", "OperatingProfit_single", "営業利益率", "自己資本比率", "売上高成長率(YoY)",
+    "Sector33Code", "Sector33CodeName", "MarketCode", "MarketCodeName",
+]
+
+
+def add_yoy_growth(df_q):
+    # 単体売上高の前年同期比（%）を、同じ銘柄・前年・同じ四半期の行と突き合わせて計算する
+    label = df_q["PeriodLabel"].astype(str)
+    df_q = df_q.assign(_year=label.str[:4].astype(int), _quarter=label.str[5:])
+    prev = df_q[[KEY, "_year", "_quarter", "NetSales_single"]].rename(columns={"NetSales_single": "_prev_sales"})
+    prev["_year"] += 1
+    df_q = df_q.merge(prev, on=[KEY, "_year", "_quarter"], how="left")
+    df_q["売上高成長率(YoY)"] = (df_q["NetSales_single"] / df_q["_prev_sales"] - 1) * 100
+    return df_q.drop(columns=["_year", "_quarter", "_prev_sales"])
+
+
+def latest_quarter(df_q):
+    # 銘柄ごとに単体売上高のある最新の四半期を1行ずつ取り出す
+    return df_q.dropna(subset=["NetSales_single"]).groupby(KEY, sort=False, observed=True).tail(1)
+
+
+def market_panel(df_st):
+    # 全銘柄の財務データ（APIレスポンス形式）から前年同期比付きの四半期パネルを作る
+    return add_yoy_growth(derive_quarterly(prepare_statements(df_st)))
+
+
+def build_screener(df_st, company_df):
+    # 全銘柄の財務データと銘柄一覧から、1銘柄1行の指標表を作る
+    if df_st.empty:
+        return pd.DataFrame(columns=SCREENER_COLUMNS)
+    df_q = market_panel(df_st)
+    latest = latest_quarter(df_q).rename(columns={KEY: "Code"})
+    latest["PeriodLabel"] = latest["PeriodLabel"].astype(str)
+    listing = company_df[[c for c in LISTING_COLUMNS if c in company_df.columns]].copy()
+    listing["Code"] = listing["Code"].astype(str)
+    latest["Code"] = latest["Code"].astype(str)
+    # 上場廃止などで銘柄一覧にない銘柄は除く
+    df = latest.merge(listing, on="Code", how="inner")
+    return df.reindex(columns=SCREENER_COLUMNS).reset_index(drop=True)
+
+
+def filter_screener(df, sector33_codes=None, market_codes=None, sort_by="営業利益率", ascending=False):
+    # 業種（33業種）・市場区分で絞り込み、指定した列で並べ替える
+    mask = pd.Series(True, index=df.index)
+    if sector33_codes:
+        mask &= df["Sector33Code"].isin(sector33_codes)
+    if market_codes:
+        mask &= df["MarketCode"].isin(market_codes)
+    return df[mask].sort_values(sort_by, ascending=ascending, na_position="last")
@@ -0,0 +1,187 @@
+import os
+import json
+import sqlite3
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import timing
+from schemas import statements_frame
+
+# 財務諸表（/fins/statements）のローカルストア
+# 開示1件をDisclosureNumber単位で保存し、画面はここから読み込む
+DB_PATH = os.path.join(os.path.dirname(__file__), "data", "statements.sqlite")
+
+# 同一銘柄の再同期はこの間隔を空ける（Streamlitの再実行ごとにAPIを呼ばない）
+SYNC_INTERVAL = timedelta(hours=1)
+# 差分同期で日付指定リクエストを発行する営業日数の上限（超えたら全件取得の方が安い）
+# 日付指定のリクエストは画面の表示中に1日ずつ順に送るので、往復の回数と
+# レート制限のバースト（jquants_client.RATE_BURST）を使い切らない程度に抑える
+MAX_INCREMENTAL_DAYS = 5
+
+
+def connect(db_path=None):
+    db_path = db_path or DB_PATH
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    # 複数セッションからの同時読み込みを書き込みでブロックしない
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS statements ("
+        "DisclosureNumber TEXT PRIMARY KEY, "
+        "Code TEXT NOT NULL, "
+        "DisclosedDate TEXT NOT NULL, "
+        "payload TEXT NOT NULL)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_statements_code_date ON statements(Code, DisclosedDate)")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sync_state ("
+        "Code TEXT PRIMARY KEY, "
+        "synced_at TEXT NOT NULL)"
+    )
+    # 銘柄ごとの書き込み回数（読み込んだDataFrameを使い回してよいかの判定用、訂正開示の上書きでも増える）
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS revisions ("
+        "Code TEXT PRIMARY KEY, "
+        "revision INTEGER NOT NULL)"
+    )
+    # 日付指定（全銘柄分）で取得済みの開示日
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS date_sync ("
+        "DisclosedDate TEXT PRIMARY KEY, "
+        "synced_at TEXT NOT NULL)"
+    )
+    return conn
+
+
+def save_statements(conn, records):
+    # 同じDisclosureNumberは上書き（訂正開示も最新の内容で保持する）
+    rows = [
+        (r["DisclosureNumber"], str(r["LocalCode"]), r["DisclosedDate"], json.dumps(r, ensure_ascii=False))
+        for r in records
+        if r.get("DisclosureNumber") and r.get("LocalCode") and r.get("DisclosedDate")
+    ]
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO statements VALUES (?, ?, ?, ?)", rows)
+        conn.executemany(
+            "INSERT INTO revisions VALUES (?, 1) ON CONFLICT(Code) DO UPDATE SET revision = revision + 1",
+            [(code,) for code in {r[1] for r in rows}],
+        )
+    return len(rows)
+
+
+def revision(conn, code):
+    # 銘柄の保存内容が変わるたびに増える値（まだ保存していなければ0）
+    row = conn.execute("SELECT revision FROM revisions WHERE Code = ?", (str(code),)).fetchone()
+    return row[0] if row else 0
+
+
+def latest_disclosed_date(conn, code):
+    row = conn.execute("SELECT MAX(DisclosedDate) FROM statements WHERE Code = ?", (str(code),)).fetchone()
+    return row[0] if row else None
+
+
+def _last_synced(conn, code):
+    row = conn.execute("SELECT synced_at FROM sync_state WHERE Code = ?", (str(code),)).fetchone()
+    return datetime.fromisoformat(row[0]) if row else None
+
+
+def _business_days(start, end):
+    return [d.strftime("%Y-%m-%d") for d in pd.bdate_range(start, end)]
+
+
+def sync_statements(code, client, conn=None, now=None):
+    # 前回この銘柄を同期した日以降の開示だけをAPIに問い合わせる（初回は全件）
+    # 戻り値は保存したレコード数（同期間隔内でスキップした場合は0）
+    own_conn = conn is None
+    conn = conn or connect()
+    now = now or datetime.now()
+    code = str(code)
+    try:
+        last_synced = _last_synced(conn, code)
+        if last_synced and now - last_synced < SYNC_INTERVAL:
+            timing.count("cache_hit")
+            return 0
+        timing.count("cache_miss")
+        # この銘柄をまだ同期していなければ全件を取得する
+        # （日付指定の一括取得（sync_statements_by_date）で直近の開示だけが入っていることがあるので、
+        # 保存済みの最新DisclosedDateはそれ以前の開示がそろっている目安にならない）
+        if last_synced is None:
+            records = client.get_paginated("/fins/statements", "statements", {"code": code})
+        else:
+            # 前回同期日の後半に出た開示を取りこぼさないよう、前回同期日から問い合わせる
+            dates = _business_days(last_synced.date(), now.date())
+            if len(dates) > MAX_INCREMENTAL_DAYS:
+                records = client.get_paginated("/fins/statements", "statements", {"code": code})
+            else:
+                records = []
+                for date in dates:
+                    records.extend(client.get_paginated("/fins/statements", "statements", {"code": code, "date": date}))
+        saved = save_statements(conn, records)
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?)", (code, now.isoformat()))
+        return saved
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def read_statements(code, conn=None):
+    # 型付きのDataFrame（schemas.STATEMENT_SCHEMA）を開示日順で返す
+    own_conn = conn is None
+    conn = conn or connect()
+    try:
+        rows = conn.execute(
+            "SELECT payload FROM statements WHERE Code = ? ORDER BY DisclosedDate, DisclosureNumber",
+            (str(code),),
+        ).fetchall()
+    finally:
+        if own_conn:
+            conn.close()
+    return statements_frame([json.loads(r[0]) for r in rows])
+
+
+def synced_dates(conn):
+    return {r[0] for r in conn.execute("SELECT DisclosedDate FROM date_sync")}
+
+
+def sync_statements_by_date(date, client, conn=None, now=None):
+    # 1日分の全銘柄の開示を取得して保存する（スクリーニング用の一括取得）
+    # 当日分は後から開示が増えるので、取得済みとして記録するのは前日以前だけ
+    own_conn = conn is None
+    conn = conn or connect()
+    now = now or datetime.now()
+    try:
+        records = client.get_paginated("/fins/statements", "statements", {"date": date})
+        saved = save_statements(conn, records)
+        if date < now.strftime("%Y-%m-%d"):
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO date_sync VALUES (?, ?)", (date, now.isoformat()))
+        return saved
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def store_version(conn=None):
+    # 保存内容が変わったかどうかの判定用（件数と最新の開示日）
+    own_conn = conn is None
+    conn = conn or connect()
+    try:
+        return tuple(conn.execute("SELECT COUNT(*), MAX(DisclosedDate) FROM statements").fetchone())
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def read_all_statements(conn=None):
+    # 保存済みの全銘柄の開示を1つの型付きDataFrameで返す
+    own_conn = conn is None
+    conn = conn or connect()
+    try:
+        rows = conn.execute("SELECT payload FROM statements ORDER BY Code, DisclosedDate, DisclosureNumber").fetchall()
+    finally:
+        if own_conn:
+            conn.close()
+    return statements_frame([json.loads(r[0]) for r in rows])
+
@@ -1,11 +1,28 @@
 import os
-import requests
 import pandas as pd
 import streamlit as st
+import timing
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
-import plotly.graph_objects as go
-import openai
+from jquants_client import JQuantsAPIError, JQuantsAuthError, JQuantsClient, TokenManager
+from company_data import company_valuation, fetch_company_data
+from company_search import CompanySearchIndex
+from listing_store import load_snapshot, refresh_in_background, refresh_snapshot, snapshot_version
+from panel_cache import load_panels, period_options, slice_periods
+from prefetch import record_access, start_in_background
+from price_series import RESAMPLE_RULES, price_chart_series, valuation_chart_frame
+from insight_cache import stream_insight
+from screener import build_screener, filter_screener
+from peers import peer_comparison
+from statement_store import read_all_statements, store_version
+from edinet_store import latest_report
+from figures import (
+    statements_version,
+    quarterly_sales_figure,
+    quarterly_balance_figure,
+    fy_sales_figure,
+    fy_balance_figure,
+)
 
 # .envから環境変数を読み込む
 dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
@@ -14,41 +31,49 @@ load_dotenv(dotenv_path)
 MAILADDRESS = os.getenv("JQUANTS_ID") or os.getenv("QUANTS_ID")
 PASSWORD = os.getenv("JQUANTS_PASSWORD") or os.getenv("PASSWORD")
 
-@st.cache_data(show_spinner=False)
-def get_id_token(mailaddress, password):
-    auth_url = "https://api.jquants.com/v1/token/auth_user"
-    auth_payload = {
-        "mailaddress": mailaddress,
-        "password": password
-    }
-    auth_res = requests.post(auth_url, json=auth_payload)
-    auth_data = auth_res.json()
-    refresh_token = auth_data.get("refreshToken")
-    if not refresh_token:
-        st.error(f"refreshTokenの取得に失敗しました: {auth_data}")
-        return None
-    refresh_url = f"https://api.jquants.com/v1/token/auth_refresh?refreshtoken={refresh_token}"
-    refresh_res = requests.post(refresh_url)
-    refresh_data = refresh_res.json()
-    id_token = refresh_data.get("idToken")
-    if not id_token:
-        st.error(f"idTokenの取得に失敗しました: {refresh_data}")
-    return id_token
+@st.cache_resource(show_spinner=False)
+def get_client(mailaddress, password):
+    # プロセス内で共有し、idTokenの更新とHTTP接続を使い回す
+    return JQuantsClient(TokenManager(mailaddress, password))
 
-@st.cache_data(show_spinner=False)
-def get_company_list(id_token):
-    url = "https://api.jquants.com/v1/listed/info"
-    headers = {"Authorization": f"Bearer {id_token}"}
-    res = requests.get(url, headers=headers)
-    if res.status_code == 200:
-        return pd.DataFrame(res.json().get("info", []))
-    return pd.DataFrame([])
+@st.cache_resource(show_spinner=False, max_entries=2)
+def get_search_index(version):
+    # 銘柄一覧のスナップショットから検索インデックスを1回だけ作り、全セッションで共有する
+    # versionはスナップショットの更新時刻（バックグラウンドで取り直したら作り直す）
+    return CompanySearchIndex(load_snapshot())
 
-ID_TOKEN = get_id_token(MAILADDRESS, PASSWORD)
-company_df = get_company_list(ID_TOKEN)
+@st.cache_resource(show_spinner=False)
+def get_openai_client(api_key):
+    # インサイトを生成するときに初めてimport・作成する（起動時に読み込まない）
+    import openai
+    return openai.OpenAI(api_key=api_key)
+
+# 1回の実行ごとに各段階の所要時間などを記録する（data/perf.jsonlに追記、サイドバーで表示）
+trace = timing.Trace("streamlit_app")
+timing.set_trace(trace)
+
+CLIENT = get_client(MAILADDRESS, PASSWORD)
+# 銘柄一覧はディスクのスナップショットを使い、古ければバックグラウンドで更新する
+# スナップショットがまだないときだけ、その場で取得する
+with timing.span("listing"):
+    if snapshot_version() is None:
+        try:
+            with st.spinner("銘柄一覧を取得中..."):
+                refresh_snapshot(CLIENT)
+        except JQuantsAuthError as e:
+            st.error(str(e))
+            st.stop()
+        except JQuantsAPIError as e:
+            st.error(f"銘柄一覧APIリクエストに失敗しました: {e.status_code}")
+            st.text(e.text)
+            st.stop()
+    else:
+        refresh_in_background(CLIENT)
+    search_index = get_search_index(snapshot_version())
+# よく見られる銘柄のデータ・パネル・グラフを、更新時刻の後にバックグラウンドで作っておく（プロセスに1つ）
+start_in_background(CLIENT)
 
 GPT_TOKEN = os.getenv("GPT_TOKEN")
-client = openai.OpenAI(api_key=GPT_TOKEN)
 
 st.title("J-Quantsを利用した上場企業の財務・株価グラフ可視化サイト")
 
@@ -67,322 +92,208 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-# 検索UIを1つに統一し、会社名または証券コードどちらでも検索できるように
-def code_to_str4(code):
-    # 5桁の証券コード（例: 70200）を4桁（7020）で表示
-    try:
-        code_int = int(float(str(code).strip()))
-        if code_int % 10 == 0 and len(str(code_int)) == 5:
-            return str(code_int)[:-1]
-        return str(code_int)
-    except Exception:
-        return str(code)
+@st.cache_data(show_spinner="全銘柄の指標を計算中...")
+def get_screener(version, _company_df):
+    # ローカルストアの内容（version）が変わったときだけ全銘柄分を計算し直す
+    return build_screener(read_all_statements(), _company_df)
+
+mode = st.sidebar.radio("表示モード", ["企業分析", "スクリーニング"])
+if st.sidebar.checkbox("処理時間を表示", key="show_perf"):
+    with st.sidebar.expander("段階ごとのp50/p95（ログ全体）"):
+        st.dataframe(timing.summarize_log(), hide_index=True)
+    st.sidebar.caption("この実行の処理時間")
+    perf_panel = st.sidebar.empty()
+    PERF_COLUMNS = ["stage", "duration_ms", "rows", "bytes", "cache_hit", "cache_miss"]
+    trace.on_update = lambda records: perf_panel.dataframe(
+        pd.DataFrame(records).reindex(columns=PERF_COLUMNS), hide_index=True
+    )
+if mode == "スクリーニング":
+    st.markdown("## スクリーニング")
+    with timing.span("screener") as perf:
+        screener_df = get_screener(store_version(), search_index.company_df)
+        perf["rows"] = len(screener_df)
+    if screener_df.empty:
+        st.warning("財務データがありません。sync_statements.pyで全銘柄の財務データを取得してください。")
+        st.stop()
+    sector_names = dict(zip(screener_df["Sector33Code"], screener_df["Sector33CodeName"]))
+    market_names = dict(zip(screener_df["MarketCode"], screener_df["MarketCodeName"]))
+    col_sector, col_market, col_sort = st.columns(3)
+    with col_sector:
+        sectors = st.multiselect("33業種", sorted(sector_names), format_func=sector_names.get)
+    with col_market:
+        markets = st.multiselect("市場区分", sorted(market_names), format_func=market_names.get)
+    with col_sort:
+        sort_by = st.selectbox("並べ替え", ["営業利益率", "自己資本比率", "売上高成長率(YoY)", "NetSales_single", "OperatingProfit_single"])
+        ascending = st.checkbox("昇順")
+    result = filter_screener(screener_df, sectors, markets, sort_by, ascending)
+    st.caption(f"{len(result)}社（各社の最新四半期、金額は100万円単位）")
+    st.dataframe(result, hide_index=True)
+    st.stop()
 
+# 検索UIを1つに統一し、会社名または証券コードどちらでも検索できるように
 search_input = st.text_input("会社名または証券コードで検索", "トヨタ")
 if search_input:
-    if search_input.isdigit() and len(search_input) == 4:
-        # 入力が4桁なら5桁化して検索
-        search_code = str(int(search_input) * 10)
-        candidates = company_df[company_df["Code"].astype(str) == search_code]
-    else:
-        # 会社名部分一致 or 5桁コード部分一致
-        candidates = company_df[
-            company_df["CompanyName"].str.contains(search_input, na=False) |
-            company_df["Code"].astype(str).str.contains(search_input)
-        ]
+    # 4桁・5桁コードは完全一致、それ以外は会社名・コードの部分一致（関連度順）
+    candidate_codes = search_index.search(search_input)
 else:
     st.stop()
-if len(candidates) == 0:
+if len(candidate_codes) == 0:
     st.warning("該当する会社がありません。")
     st.stop()
-company_name = st.selectbox(
-    "会社を選択",
-    candidates["CompanyName"] + "（" + candidates["Code"].apply(code_to_str4) + "）"
-)
-selected_code = candidates[
-    candidates["CompanyName"] + "（" + candidates["Code"].apply(code_to_str4) + "）" == company_name
-]["Code"].values[0]
+selected_code = st.selectbox("会社を選択", candidate_codes, format_func=search_index.label)
+company_name = search_index.label(selected_code)
+# 事前取得する銘柄を決めるため、表示した銘柄を記録する（同じセッションの再実行では数えない）
+if st.session_state.get("recorded_code") != selected_code:
+    record_access(selected_code)
+    st.session_state["recorded_code"] = selected_code
 
-# 財務データ取得
-url_st = f"https://api.jquants.com/v1/fins/statements?code={selected_code}"
-headers = {"Authorization": f"Bearer {ID_TOKEN}"}
-res_st = requests.get(url_st, headers=headers)
-if res_st.status_code == 200:
-    st_data = res_st.json().get("statements", [])
-    if st_data:
-        df_st = pd.DataFrame(st_data)
+has_quarterly = False
+fy_options = []
+price_window_start = None
+# 財務データ・株価・銘柄情報を並列に取得（財務データはローカルストアを差分同期してから読み込む）
+with timing.span("company_data"):
+    frames, fetch_errors = fetch_company_data(CLIENT, selected_code)
+listed_info = frames["listed_info"]
+if not listed_info.empty:
+    info = listed_info.iloc[-1]
+    st.caption(f"{info.get('MarketCodeName', '')} / {info.get('Sector33CodeName', '')}")
+# EDINETの最新の報告書（sync_edinet.pyで作った索引から引く）
+report = latest_report(selected_code)
+if report is not None:
+    st.caption(f"最新の報告書: {report.get('docDescription', '')}（提出日時: {report.get('submitDateTime', '')}、docID: {report['docID']}）")
+
+df_st = frames["statements"]
+st_error = fetch_errors.get("statements")
+if st_error is None:
+    if not df_st.empty:
         # API取得元データをアコーディオンで表示
         with st.expander("元データ"):
             st.dataframe(df_st)
-        df_st = df_st[df_st["DisclosedDate"].notnull()]
-        df_st["DisclosedDate"] = pd.to_datetime(df_st["DisclosedDate"], errors="coerce")
-        df_st["CurrentFiscalYearEndDate"] = pd.to_datetime(df_st["CurrentFiscalYearEndDate"], errors="coerce")
-        # 四半期・通期ラベル
-        def make_label(row):
-            year = row["CurrentFiscalYearEndDate"].year if pd.notnull(row["CurrentFiscalYearEndDate"]) else None
-            period = row.get("TypeOfCurrentPeriod", "")
-            if year is None:
-                return None
-            if "FY" in period or "通期" in period or period == "":
-                return f"{year}/FY"
-            q = period.replace("Quarter", "Q") if "Quarter" in period else period
-            return f"{year}/{q}" if year and q else None
-        df_st["PeriodLabel"] = df_st.apply(make_label, axis=1)
-        df_st = df_st.sort_values(["CurrentFiscalYearEndDate", "TypeOfCurrentPeriod"])
-        # 年度×四半期の全組み合わせをCurrentFiscalYearEndDateの年で作成
-        all_years = sorted(df_st["CurrentFiscalYearEndDate"].dt.year.dropna().unique())
-        all_quarters = ["1Q", "2Q", "3Q", "4Q"]
-        q_rows = []
-        for year in all_years:
-            for q in all_quarters:
-                if q == "4Q":
-                    fy = df_st[(df_st["CurrentFiscalYearEndDate"].dt.year == year) & (df_st["TypeOfCurrentPeriod"].isin(["FY", "通期"]))]
-                    q3 = df_st[(df_st["CurrentFiscalYearEndDate"].dt.year == year) & (df_st["TypeOfCurrentPeriod"] == "3Q")]
-                    if len(fy) == 1 and len(q3) == 1:
-                        fy_net = pd.to_numeric(fy.iloc[0]["NetSales"], errors="coerce")
-                        q3_net = pd.to_numeric(q3.iloc[0]["NetSales"], errors="coerce")
-                        if pd.isna(fy_net) or pd.isna(q3_net) or (q3_net > fy_net):
-                            netsales_single = None
-                        else:
-                            netsales_single = fy_net - q3_net
-                        row = fy.iloc[0].copy()
-                        row["TypeOfCurrentPeriod"] = "4Q"
-                        row["PeriodLabel"] = f"{year}/4Q"
-                        row["NetSales_single"] = netsales_single
-                        row["TotalAssets"] = pd.to_numeric(fy.iloc[0]["TotalAssets"], errors="coerce")
-                        row["Equity"] = pd.to_numeric(fy.iloc[0]["Equity"], errors="coerce")
-                        q_rows.append(row.to_dict())
-                    else:
-                        q_rows.append({"PeriodLabel": f"{year}/4Q", "TypeOfCurrentPeriod": "4Q"})
-                else:
-                    qdata = df_st[(df_st["CurrentFiscalYearEndDate"].dt.year == year) & (df_st["TypeOfCurrentPeriod"] == q)]
-                    if len(qdata) == 1:
-                        row = qdata.iloc[0].copy()
-                        row["PeriodLabel"] = f"{year}/{q}"
-                        if q == "1Q":
-                            row["NetSales_single"] = pd.to_numeric(row["NetSales"], errors="coerce")
-                        else:
-                            prev_q = all_quarters[all_quarters.index(q)-1]
-                            prev_data = df_st[(df_st["CurrentFiscalYearEndDate"].dt.year == year) & (df_st["TypeOfCurrentPeriod"] == prev_q)]
-                            if len(prev_data) == 1:
-                                row["NetSales_single"] = pd.to_numeric(row["NetSales"], errors="coerce") - pd.to_numeric(prev_data.iloc[0]["NetSales"], errors="coerce")
-                            else:
-                                row["NetSales_single"] = None
-                        row["TotalAssets"] = pd.to_numeric(row["TotalAssets"], errors="coerce") if "TotalAssets" in row else None
-                        row["Equity"] = pd.to_numeric(row["Equity"], errors="coerce") if "Equity" in row else None
-                        q_rows.append(row.to_dict())
-                    else:
-                        q_rows.append({"PeriodLabel": f"{year}/{q}", "TypeOfCurrentPeriod": q})
-        df_q = pd.DataFrame(q_rows)
-        df_q = df_q[df_q["TypeOfCurrentPeriod"].isin(["1Q", "2Q", "3Q", "4Q"])]
-        # PeriodLabel順序をCurrentFiscalYearEndDateの年で明示的に指定して時系列順に並べる
-        years = sorted(df_q["PeriodLabel"].dropna().apply(lambda x: int(str(x)[:4])).unique())
-        period_order = []
-        for year in years:
-            for q in ["1Q", "2Q", "3Q", "4Q"]:
-                period_order.append(f"{year}/{q}")
-        df_q["PeriodLabel"] = pd.Categorical(df_q["PeriodLabel"], categories=period_order, ordered=True)
-        df_q = df_q.sort_values("PeriodLabel")
+        # 年度×四半期・通期のパネル（単体値・100万円単位・比率を含む）は、新しい開示が入ったときだけ作り直し、
+        # 全セッションで共有する（panel_cache、data/panelsにも保存）
+        with timing.span("panels") as perf:
+            df_q, df_fy = load_panels(selected_code, df_st)
+            perf["rows"] = len(df_q)
         # 実際にデータが存在する最初と最後の四半期を取得
         valid_periods = df_q.dropna(subset=["NetSales_single"])['PeriodLabel'].tolist()
         if valid_periods:
             min_period = valid_periods[0]
             max_period = valid_periods[-1]
             st.info(f"グラフが表示できる期間: {min_period} ～ {max_period}")
-        # 株価も同じ期間で自動的にフィルタ
-        if 'df_price' in locals() and len(df_q) > 0:
-            min_period = df_q["DisclosedDate"].min()
-            max_period = df_q["DisclosedDate"].max()
-            df_price = df_price[(df_price["Date"] >= min_period) & (df_price["Date"] <= max_period)]
-        # 数値変換（100万円単位）
-        df_q["NetSales_single"] = pd.to_numeric(df_q["NetSales_single"], errors="coerce") / 1e6
-        df_q["NetSales"] = pd.to_numeric(df_q["NetSales"], errors="coerce") / 1e6
-        df_q["OperatingProfit"] = pd.to_numeric(df_q["OperatingProfit"], errors="coerce") / 1e6
-        df_q["営業利益率"] = df_q["OperatingProfit"] / df_q["NetSales"] * 100
-        df_q["TotalAssets"] = pd.to_numeric(df_q["TotalAssets"], errors="coerce") / 1e6
-        df_q["Equity"] = pd.to_numeric(df_q["Equity"], errors="coerce") / 1e6
-        df_q["自己資本比率"] = pd.to_numeric(df_q["Equity"], errors="coerce") / pd.to_numeric(df_q["TotalAssets"], errors="coerce") * 100
-        # --- 差分計算: 各期間の単体値を追加・グラフ・GPT用データ処理はdf_qが空でない場合のみ ---
-        if not df_q.empty:
-            df_q = df_q.sort_values("PeriodLabel")
-            df_q["OperatingProfit_single"] = df_q["OperatingProfit"].diff().fillna(df_q["OperatingProfit"])
-            df_q["TotalAssets_single"] = df_q["TotalAssets"].diff().fillna(df_q["TotalAssets"])
-            df_q["Equity_single"] = df_q["Equity"].diff().fillna(df_q["Equity"])
-            # 売上高（単体値）・営業利益（単体値）・営業利益率（累積）のグラフ（四半期）
-            fig1 = go.Figure()
-            fig1.add_trace(go.Bar(x=df_q["PeriodLabel"], y=df_q["NetSales_single"], name="売上高（100万円,単体）", marker_color="royalblue"))
-            fig1.add_trace(go.Bar(x=df_q["PeriodLabel"], y=df_q["OperatingProfit_single"], name="営業利益（100万円,単体）", marker_color="orange"))
-            fig1.add_trace(go.Scatter(x=df_q["PeriodLabel"], y=df_q["営業利益率"], name="営業利益率(%)", yaxis="y2", mode="lines+markers", marker_color="green"))
-            fig1.update_layout(
-                title="売上高（単体）・営業利益（単体）・営業利益率の推移（四半期）",
-                xaxis_title="四半期",
-                yaxis=dict(title="金額（100万円）", zeroline=True, range=[0, max(df_q["NetSales_single"].max(), df_q["OperatingProfit_single"].max(), 1) * 1.1]),
-                yaxis2=dict(title="営業利益率(%)", overlaying="y", side="right", range=[0, 100], zeroline=True),
-                barmode="group"
-            )
-            # 総資産・純資産（累積）・自己資本比率（累積）のグラフ（四半期）
-            fig2 = go.Figure()
-            fig2.add_trace(go.Bar(x=df_q["PeriodLabel"], y=df_q["TotalAssets"], name="総資産（100万円,累積）", marker_color="royalblue"))
-            fig2.add_trace(go.Bar(x=df_q["PeriodLabel"], y=df_q["Equity"], name="純資産（100万円,累積）", marker_color="orange"))
-            fig2.add_trace(go.Scatter(x=df_q["PeriodLabel"], y=df_q["自己資本比率"], name="自己資本比率(%)", yaxis="y2", mode="lines+markers", marker_color="green"))
-            fig2.update_layout(
-                title="総資産（累積）・純資産（累積）・自己資本比率の推移（四半期）",
-                xaxis_title="四半期",
-                yaxis=dict(title="金額（100万円）"),
-                yaxis2=dict(title="自己資本比率(%)", overlaying="y", side="right", range=[0, 100]),
-                barmode="group"
-            )
-        else:
+        # 株価も財務データの最初の開示日から表示する（直近の株価は開示日以降も表示）
+        if len(df_q) > 0:
+            price_window_start = df_q["DisclosedDate"].min()
+        # --- グラフ・GPT用データ処理はdf_qが空でない場合のみ ---
+        has_quarterly = not df_q.empty
+        if not has_quarterly:
             st.warning("四半期データがありません。")
         # 通期グラフはFY/通期のみ厳密に
-        df_fy = df_st[df_st["TypeOfCurrentPeriod"].isin(["FY", "通期"])]
-        # 必ず必要な列を計算
-        if not df_fy.empty:
-            df_fy = df_fy.sort_values("DisclosedDate")
-            df_fy["NetSales"] = pd.to_numeric(df_fy["NetSales"], errors="coerce") / 1e6
-            df_fy["OperatingProfit"] = pd.to_numeric(df_fy["OperatingProfit"], errors="coerce") / 1e6
-            df_fy["営業利益率"] = df_fy["OperatingProfit"] / df_fy["NetSales"] * 100
-            df_fy["TotalAssets"] = pd.to_numeric(df_fy["TotalAssets"], errors="coerce") / 1e6
-            df_fy["Equity"] = pd.to_numeric(df_fy["Equity"], errors="coerce") / 1e6
-            df_fy["自己資本比率"] = df_fy["Equity"] / df_fy["TotalAssets"] * 100
-        # 通期グラフ
         fy_options = df_fy["PeriodLabel"].tolist()
-        if fy_options:
-            # 売上高・営業利益・営業利益率のグラフ（通期）
-            fig3 = go.Figure()
-            fig3.add_trace(go.Bar(x=df_fy["PeriodLabel"], y=df_fy["NetSales"], name="売上高（100万円）", marker_color="royalblue"))
-            fig3.add_trace(go.Bar(x=df_fy["PeriodLabel"], y=df_fy["OperatingProfit"], name="営業利益（100万円）", marker_color="orange"))
-            fig3.add_trace(go.Scatter(x=df_fy["PeriodLabel"], y=df_fy["営業利益率"], name="営業利益率(%)", yaxis="y2", mode="lines+markers", marker_color="green"))
-            fig3.update_layout(
-                title="売上高・営業利益・営業利益率の推移（通期）",
-                xaxis_title="通期(FY)",
-                yaxis=dict(title="金額（100万円）"),
-                yaxis2=dict(title="営業利益率(%)", overlaying="y", side="right", range=[0, 100]),
-                barmode="group"
-            )
-            # 総資産・純資産・自己資本比率のグラフ（通期）
-            fig4 = go.Figure()
-            fig4.add_trace(go.Bar(x=df_fy["PeriodLabel"], y=df_fy["TotalAssets"], name="総資産（100万円）", marker_color="royalblue"))
-            fig4.add_trace(go.Bar(x=df_fy["PeriodLabel"], y=df_fy["Equity"], name="純資産（100万円）", marker_color="orange"))
-            fig4.add_trace(go.Scatter(x=df_fy["PeriodLabel"], y=df_fy["自己資本比率"], name="自己資本比率(%)", yaxis="y2", mode="lines+markers", marker_color="green"))
-            fig4.update_layout(
-                title="総資産・純資産・自己資本比率の推移（通期）",
-                xaxis_title="通期(FY)",
-                yaxis=dict(title="金額（100万円）"),
-                yaxis2=dict(title="自己資本比率(%)", overlaying="y", side="right", range=[0, 100]),
-                barmode="group"
-            )
+        # グラフのキャッシュキー（新しい開示が入ったときだけ作り直す）
+        st_version = statements_version(df_st)
     else:
         st.warning("財務データがありません。")
+elif isinstance(st_error, JQuantsAPIError):
+    st.error(f"財務データAPIリクエストに失敗しました: {st_error.status_code}")
+    st.text(st_error.text)
 else:
-    st.error(f"財務データAPIリクエストに失敗しました: {res_st.status_code}")
-    st.text(res_st.text)
+    # 認証エラー・通信エラー（タイムアウトなど）
+    st.error(f"財務データの取得に失敗しました: {st_error}")
 
 # 株価データ取得（参考表示）
-url_price = f"https://api.jquants.com/v1/prices/daily_quotes?code={selected_code}"
-res_price = requests.get(url_price, headers=headers)
-if res_price.status_code == 200:
-    price_data = res_price.json().get("daily_quotes", [])
-    if price_data:
-        df_price = pd.DataFrame(price_data)
-        df_price["Date"] = pd.to_datetime(df_price["Date"], errors="coerce")
-        # 株価も同じ期間でスライス
-        if 'date_range' in locals():
-            df_price = df_price[(df_price["Date"] >= pd.to_datetime(date_range[0])) & (df_price["Date"] <= pd.to_datetime(date_range[1]))]
+price_error = fetch_errors.get("daily_quotes")
+if price_error is None:
+    if not frames["daily_quotes"].empty:
+        df_price = frames["daily_quotes"]
         pass  # グラフ描画は下でまとめて行う
     else:
         st.warning("株価データがありません。")
+elif isinstance(price_error, JQuantsAPIError):
+    st.error(f"株価データAPIリクエストに失敗しました: {price_error.status_code}")
+    st.text(price_error.text)
 else:
-    st.error(f"株価データAPIリクエストに失敗しました: {res_price.status_code}")
-    st.text(res_price.text)
+    # 認証エラー・通信エラー（タイムアウトなど）
+    st.error(f"株価データの取得に失敗しました: {price_error}")
 
 # --- 株価グラフ（最初に表示） ---
 if 'df_price' in locals() and not df_price.empty:
     st.markdown("## 株価グラフ")
-    df_price_disp = df_price.copy()
-    df_price_disp["日付"] = df_price_disp["Date"].dt.strftime("%Y年%m月%d日")
-    st.line_chart(df_price_disp.set_index("日付")["Close"])
+    price_freq = st.radio("表示単位", list(RESAMPLE_RULES), horizontal=True, key="price_freq")
+    # 表示期間で切り出し、週足・月足への変換と間引きで点数を一定以下に抑える
+    with timing.span("price_chart") as perf:
+        price_points = price_chart_series(df_price, price_freq, start=price_window_start)
+        perf["rows"] = len(price_points)
+    st.line_chart(price_points)
+    # 各営業日にその日までの最新の開示を結び付けたPER・PBR・時価総額
+    with timing.span("valuation") as perf:
+        df_val = company_valuation(selected_code, df_price, frames["statements"])
+        perf["rows"] = len(df_val)
+    if not df_val.empty and df_val["MarketCap"].notna().any():
+        st.markdown("## バリュエーション")
+        latest_val = df_val.iloc[-1]
+        m1, m2, m3 = st.columns(3)
+        m1.metric("PER（実績）", f"{latest_val['PER']:.1f}倍" if pd.notna(latest_val["PER"]) else "-")
+        m2.metric("PBR", f"{latest_val['PBR']:.2f}倍" if pd.notna(latest_val["PBR"]) else "-")
+        m3.metric("時価総額", f"{latest_val['MarketCap'] / 1e8:,.0f}億円" if pd.notna(latest_val["MarketCap"]) else "-")
+        # 点数を抑えるため週末時点（期間が長ければ月末・四半期末時点）の値で描く
+        st.line_chart(valuation_chart_frame(df_val, start=price_window_start))
 
 # --- 四半期グラフ・通期グラフ・インサイトを横並びで ---
-if 'fig1' in locals() and 'fig2' in locals():
+if has_quarterly:
     col1, col2 = st.columns([2, 1])
     with col1:
         st.markdown("## 四半期")
         # 四半期表示期間スライサー（データが存在する範囲のみ選択肢にする）
-        valid_periods = df_q.dropna(subset=["NetSales_single"])["PeriodLabel"].tolist()
-        if valid_periods:
-            min_period = valid_periods[0]
-            max_period = valid_periods[-1]
-            period_labels = [p for p in df_q["PeriodLabel"].dropna().unique().tolist() if (min_period <= p <= max_period)]
-            if len(period_labels) >= 2:
-                start_idx, end_idx = st.select_slider(
-                    "表示する四半期期間を選択",
-                    options=period_labels,
-                    value=(period_labels[0], period_labels[-1])
-                )
-                start_pos = period_labels.index(start_idx)
-                end_pos = period_labels.index(end_idx)
-                selected_labels = period_labels[start_pos:end_pos+1]
-                df_q_filtered = df_q[df_q["PeriodLabel"].isin(selected_labels)].copy()
-            else:
-                df_q_filtered = df_q.copy()
+        period_labels = period_options(df_q)
+        if len(period_labels) >= 2:
+            start_idx, end_idx = st.select_slider(
+                "表示する四半期期間を選択",
+                options=period_labels,
+                value=(period_labels[0], period_labels[-1])
+            )
+            df_q_filtered = slice_periods(df_q, start_idx, end_idx)
+            period_range = (start_idx, end_idx)
         else:
-            df_q_filtered = df_q.copy()
+            df_q_filtered = df_q
+            period_range = None
         # スライダーでフィルタしたdf_q_filteredのみを以降で使用
-        # 四半期グラフ
-        fig1 = go.Figure()
-        fig1.add_trace(go.Bar(x=df_q_filtered["PeriodLabel"], y=df_q_filtered["NetSales_single"], name="売上高（100万円,単体）", marker_color="royalblue"))
-        fig1.add_trace(go.Bar(x=df_q_filtered["PeriodLabel"], y=df_q_filtered["OperatingProfit_single"], name="営業利益（100万円,単体）", marker_color="orange"))
-        fig1.add_trace(go.Scatter(x=df_q_filtered["PeriodLabel"], y=df_q_filtered["営業利益率"], name="営業利益率(%)", yaxis="y2", mode="lines+markers", marker_color="green"))
-        fig1.update_layout(
-            title="売上高（単体）・営業利益（単体）・営業利益率の推移（四半期）",
-            xaxis_title="四半期",
-            yaxis=dict(title="金額（100万円）", zeroline=True, range=[0, max(df_q_filtered["NetSales_single"].max(), df_q_filtered["OperatingProfit_single"].max(), 1) * 1.1]),
-            yaxis2=dict(title="営業利益率(%)", overlaying="y", side="right", range=[0, 100], zeroline=True),
-            barmode="group"
-        )
-        fig2 = go.Figure()
-        fig2.add_trace(go.Bar(x=df_q_filtered["PeriodLabel"], y=df_q_filtered["TotalAssets"], name="総資産（100万円,累積）", marker_color="royalblue"))
-        fig2.add_trace(go.Bar(x=df_q_filtered["PeriodLabel"], y=df_q_filtered["Equity"], name="純資産（100万円,累積）", marker_color="orange"))
-        fig2.add_trace(go.Scatter(x=df_q_filtered["PeriodLabel"], y=df_q_filtered["自己資本比率"], name="自己資本比率(%)", yaxis="y2", mode="lines+markers", marker_color="green"))
-        fig2.update_layout(
-            title="総資産（累積）・純資産（累積）・自己資本比率の推移（四半期）",
-            xaxis_title="四半期",
-            yaxis=dict(title="金額（100万円）"),
-            yaxis2=dict(title="自己資本比率(%)", overlaying="y", side="right", range=[0, 100]),
-            barmode="group"
-        )
+        # 四半期グラフ（スライダーの範囲が変わったときだけ作り直す）
+        with timing.span("figures_quarterly"):
+            fig1 = quarterly_sales_figure(df_q_filtered, selected_code, st_version, period_range)
+            fig2 = quarterly_balance_figure(df_q_filtered, selected_code, st_version, period_range)
         st.plotly_chart(fig1, use_container_width=True, key="main_fig1")
         st.plotly_chart(fig2, use_container_width=True, key="main_fig2")
         # 通期グラフも同じカラムに（四半期スライダーのフィルターを適用しない）
-        if 'fig3' in locals() and 'fig4' in locals() and fy_options:
+        if fy_options:
             st.markdown("## 通期")
             # 通期グラフはdf_fyの全データを表示
-            if not df_fy.empty:
-                fig3 = go.Figure()
-                fig3.add_trace(go.Bar(x=df_fy["PeriodLabel"], y=df_fy["NetSales"], name="売上高（100万円）", marker_color="royalblue"))
-                fig3.add_trace(go.Bar(x=df_fy["PeriodLabel"], y=df_fy["OperatingProfit"], name="営業利益（100万円）", marker_color="orange"))
-                fig3.add_trace(go.Scatter(x=df_fy["PeriodLabel"], y=df_fy["営業利益率"], name="営業利益率(%)", yaxis="y2", mode="lines+markers", marker_color="green"))
-                fig3.update_layout(
-                    title="売上高・営業利益・営業利益率の推移（通期）",
-                    xaxis_title="通期(FY)",
-                    yaxis=dict(title="金額（100万円）"),
-                    yaxis2=dict(title="営業利益率(%)", overlaying="y", side="right", range=[0, 100]),
-                    barmode="group"
-                )
-                fig4 = go.Figure()
-                fig4.add_trace(go.Bar(x=df_fy["PeriodLabel"], y=df_fy["TotalAssets"], name="総資産（100万円）", marker_color="royalblue"))
-                fig4.add_trace(go.Bar(x=df_fy["PeriodLabel"], y=df_fy["Equity"], name="純資産（100万円）", marker_color="orange"))
-                fig4.add_trace(go.Scatter(x=df_fy["PeriodLabel"], y=df_fy["自己資本比率"], name="自己資本比率(%)", yaxis="y2", mode="lines+markers", marker_color="green"))
-                fig4.update_layout(
-                    title="総資産・純資産・自己資本比率の推移（通期）",
-                    xaxis_title="通期(FY)",
-                    yaxis=dict(title="金額（100万円）"),
-                    yaxis2=dict(title="自己資本比率(%)", overlaying="y", side="right", range=[0, 100]),
-                    barmode="group"
-                )
-                st.plotly_chart(fig3, use_container_width=True, key="main_fig3")
-                st.plotly_chart(fig4, use_container_width=True, key="main_fig4")
+            with timing.span("figures_fy"):
+                fig3 = fy_sales_figure(df_fy, selected_code, st_version)
+                fig4 = fy_balance_figure(df_fy, selected_code, st_version)
+            st.plotly_chart(fig3, use_container_width=True, key="main_fig3")
+            st.plotly_chart(fig4, use_container_width=True, key="main_fig4")
+        # 同業他社との比較（sync_statements.pyで事前に作った業種別統計を読むだけ）
+        company_info = search_index.company_info(selected_code)
+        if company_info is not None:
+            st.markdown("## 同業他社との比較")
+            sector_type = st.radio(
+                "業種分類",
+                ["Sector33Code", "Sector17Code"],
+                format_func=lambda c: "33業種" if c == "Sector33Code" else "17業種",
+                horizontal=True,
+                key="peer_sector",
+            )
+            sector_name = company_info.get(sector_type.replace("Code", "CodeName"), "")
+            peer_labels = df_q_filtered.dropna(subset=["NetSales_single"])["PeriodLabel"].astype(str).tolist()[-4:]
+            with timing.span("peers"):
+                df_peer = peer_comparison(selected_code, sector_type, company_info[sector_type], peer_labels)
+            if df_peer is None:
+                st.caption("業種別統計がありません。sync_statements.pyを実行すると作成されます。")
+            elif df_peer.empty:
+                st.caption("表示中の期間に比較できるデータがありません。")
+            else:
+                st.caption(f"業種: {sector_name}（業種内順位は100に近いほど上位）")
+                st.dataframe(df_peer, hide_index=True, use_container_width=True)
         # ChatGPTインサイトもdf_q_filteredのみで生成
     with col2:
         st.markdown("## ChatGPTインサイト")
@@ -422,15 +333,22 @@ if 'fig1' in locals() and 'fig2' in locals():
                 "自己資本 箇条書きで200文字以内\n"
                 "インサイト（質問） 箇条書きで500文字以内\n"
             )
-            with st.spinner("ChatGPTがインサイトを生成中..."):
-                response = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[{"role": "user", "content": user_prompt}],
+            # 同じ企業・期間・プロンプトの結果はディスクキャッシュから即座に返し、
+            # 未生成のときは届いた部分から順に表示する
+            st.markdown("### 💡 ChatGPTによるインサイト")
+            placeholder = st.empty()
+            insight = ""
+            with st.spinner("ChatGPTがインサイトを生成中..."), timing.span("insight"):
+                for chunk in stream_insight(
+                    get_openai_client(GPT_TOKEN),
+                    "gpt-3.5-turbo",
+                    [{"role": "user", "content": user_prompt}],
                     max_tokens=800,
                     temperature=0.5,
-                )
-                insight = response.choices[0].message.content
-                st.session_state["insight"] = insight
-        if "insight" in st.session_state:
+                ):
+                    insight += chunk
+                    placeholder.code(insight, language="json")
+            st.session_state["insight"] = insight
+        elif "insight" in st.session_state:
             st.markdown("### 💡 ChatGPTによるインサイト")
-            st.code(st.session_state["insight"], language="json") 
\ No newline at end of file
+            st.code(st.session_state["insight"], language="json")
@@ -0,0 +1,31 @@
+import os
+
+import pandas as pd
+
+from bulk_sync import date_range_parser, exit_if_failed, load_env, sync_dates
+from edinet_client import EdinetAPIError, EdinetClient
+from edinet_store import connect, synced_dates, sync_documents_by_date
+
+# EDINETの書類一覧を日付ごとに取得し、ローカル索引に保存する
+# 例: python sync_edinet.py --start 2023-01-01 --end 2024-12-31
+# 取得済みの日付は記録されるので、再実行すると未取得の日付だけを取得する
+
+
+def main():
+    parser = date_range_parser("EDINETの書類一覧を取得してローカル索引を作ります")
+    args = parser.parse_args()
+    load_env()
+    # 取得結果はローカル索引に保存するので、HTTPキャッシュには入れない
+    client = EdinetClient(os.getenv("EDINET_API_KEY"), use_cache=False)
+
+    # 土日祝にも提出されることがあるので暦日で取得する
+    dates = [d.strftime("%Y-%m-%d") for d in pd.date_range(args.start, args.end or pd.Timestamp.today())]
+    conn = connect()
+    done = synced_dates(conn)
+    conn.close()
+    failed = sync_dates(dates, done, lambda d: sync_documents_by_date(d, client), EdinetAPIError, args.workers, args.force)
+    exit_if_failed(failed)
+
+
+if __name__ == "__main__":
+    main()
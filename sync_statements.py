@@ -0,0 +1,35 @@
+import pandas as pd
+
+from bulk_sync import date_range_parser, exit_if_failed, jquants_bulk_client, load_env, sync_dates
+from jquants_client import JQuantsAPIError
+from peers import build_peer_stats, save_peer_stats
+from schemas import listed_info_frame
+from screener import market_panel
+from statement_store import connect, read_all_statements, synced_dates, sync_statements_by_date
+
+# 全銘柄の財務データを開示日指定で取得し、ローカルストアに保存する（スクリーニング用）
+# 例: python sync_statements.py --start 2019-01-01 --end 2024-12-31
+# 取得済みの開示日は記録されるので、再実行すると未取得の日付だけを取得する
+# 取得後に同業他社比較用の業種別統計（peers.py）を作り直す
+
+
+def main():
+    parser = date_range_parser("J-Quantsの財務データ（全銘柄）を開示日指定で取得します")
+    args = parser.parse_args()
+    load_env()
+    client = jquants_bulk_client()
+
+    dates = [d.strftime("%Y-%m-%d") for d in pd.bdate_range(args.start, args.end or pd.Timestamp.today())]
+    conn = connect()
+    done = synced_dates(conn)
+    conn.close()
+    failed = sync_dates(dates, done, lambda d: sync_statements_by_date(d, client), JQuantsAPIError, args.workers, args.force)
+    # 同業他社比較用の業種別統計を作り直す
+    print("同業他社比較用の統計を作成しています...")
+    company_df = listed_info_frame(client.get("/listed/info").get("info", []))
+    save_peer_stats(*build_peer_stats(market_panel(read_all_statements()), company_df))
+    exit_if_failed(failed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import os
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+from edinet_client import EdinetAPIError, EdinetClient
+from edinet_store import REPORT_DOC_TYPES, find_documents
+from xbrl_extract import XBRL_DIR, extract_filings, read_financials, save_financials
+
+# ローカル索引（sync_edinet.py）にある報告書のXBRLをダウンロードし、
+# キャッシュフロー・貸借対照表の主要項目を並列に取り出して保存する
+# 例: python sync_xbrl.py --workers 4 --processes 8
+# ダウンロード済み・解析済みの書類は飛ばすので、再実行すると新しい書類だけを処理する
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EDINETの報告書のXBRLからキャッシュフロー・貸借対照表の項目を取り出します")
+    parser.add_argument("--workers", type=int, default=4, help="同時にダウンロードする書類数")
+    parser.add_argument("--processes", type=int, help="XBRLを解析するプロセス数（省略時はCPU数）")
+    args = parser.parse_args()
+
+    # .envから環境変数を読み込む
+    dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
+    load_dotenv(dotenv_path)
+    client = EdinetClient(os.getenv("EDINET_API_KEY"))
+
+    docs = find_documents(doc_types=REPORT_DOC_TYPES)
+    if docs.empty:
+        print("書類の索引がありません。先にsync_edinet.pyを実行してください。")
+        exit(1)
+    # 取下げ済み・XBRLのない書類は対象外
+    docs = docs[(docs["withdrawalStatus"].fillna("0") == "0") & (docs["xbrlFlag"].fillna("0") == "1")]
+    doc_ids = docs["docID"].tolist()
+    paths = {doc_id: os.path.join(XBRL_DIR, f"{doc_id}.zip") for doc_id in doc_ids}
+    pending = [doc_id for doc_id in doc_ids if not os.path.exists(paths[doc_id])]
+    print(f"対象: {len(doc_ids)}件 / ダウンロード済み: {len(doc_ids) - len(pending)}件 / 残り: {len(pending)}件")
+
+    failed = 0
+    executor = ThreadPoolExecutor(max_workers=args.workers)
+    try:
+        futures = {executor.submit(client.download_document, doc_id, paths[doc_id]): doc_id for doc_id in pending}
+        for future in as_completed(futures):
+            doc_id = futures[future]
+            try:
+                future.result()
+            except EdinetAPIError as e:
+                failed += 1
+                print(f"{doc_id}: ダウンロードに失敗しました: {e.status_code}")
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    # 解析はCPU負荷が高いのでプロセスを分けて並列に行う
+    done = set(read_financials()["docID"])
+    targets = [paths[doc_id] for doc_id in doc_ids if doc_id not in done and os.path.exists(paths[doc_id])]
+    print(f"XBRLを解析しています: {len(targets)}件")
+    df = extract_filings(targets, workers=args.processes)
+    print(f"解析できた書類: {len(df)}件 / 保存済みの合計: {save_financials(df)}件")
+    if failed:
+        print(f"{failed}件のダウンロードに失敗しました。再実行すると未取得の書類から再開します。")
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+# 処理段階ごとの計測（所要時間・受信バイト数・行数・キャッシュのヒット/ミス）
+# 画面の1回の実行（rerun）を1つのTraceとし、各段階をspanとして記録する
+# 記録はJSONLに1行ずつ追記し、段階ごとのp50/p95の集計に使う
+LOG_PATH = os.path.join(os.path.dirname(__file__), "data", "perf.jsonl")
+# ログがこのサイズを超えたら .1 に退避して新しいファイルに書く
+MAX_LOG_BYTES = 10 * 1024 * 1024
+
+_local = threading.local()
+_log_lock = threading.Lock()
+
+
+class Trace:
+    def __init__(self, name, log_path=None, on_update=None):
+        self.name = name
+        self.run_id = uuid.uuid4().hex[:12]
+        self.log_path = log_path or LOG_PATH
+        # 作成したスレッドでspanが終わるたびに呼ぶ（デバッグ表示の更新用）
+        self.on_update = on_update
+        self.records = []
+        self._owner = threading.get_ident()
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        record = {"ts": round(time.time(), 3), "page": self.name, "run": self.run_id, **record}
+        with self._lock:
+            self.records.append(record)
+        write_log(record, self.log_path)
+        if self.on_update and threading.get_ident() == self._owner:
+            self.on_update(self.records)
+
+
+def current_trace():
+    return getattr(_local, "trace", None)
+
+
+def set_trace(trace):
+    # 以降このスレッドで実行する処理をtraceに記録する（streamlitの1回の実行の先頭で呼ぶ）
+    _local.trace = trace
+    _local.stack = []
+
+
+@contextmanager
+def activate(trace):
+    # withの間だけtraceに記録する（ワーカースレッドで呼び出し元のtraceを使うとき）
+    prev_trace = getattr(_local, "trace", None)
+    prev_stack = getattr(_local, "stack", [])
+    set_trace(trace)
+    try:
+        yield trace
+    finally:
+        _local.trace = prev_trace
+        _local.stack = prev_stack
+
+
+@contextmanager
+def span(stage, **fields):
+    # 段階の所要時間を測る。withで受け取るdictにrowsなどを書き込むと一緒に記録される
+    # 有効なtraceがなければ何も記録しない
+    info = dict(fields)
+    trace = current_trace()
+    if trace is None:
+        yield info
+        return
+    stack = _local.stack
+    stack.append(info)
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        duration = time.perf_counter() - start
+        stack.pop()
+        trace.add({"stage": stage, "duration_ms": round(duration * 1000, 2), **info})
+
+
+def count(key, n=1):
+    # 実行中のspan（入れ子の外側も含む）のカウンタに加算する（bytes, cache_hit, cache_missなど）
+    for info in getattr(_local, "stack", []):
+        info[key] = info.get(key, 0) + n
+
+
+def traced(trace, stage, fn, *args, **kwargs):
+    # ワーカースレッドで実行する関数を、呼び出し元のtraceのspanとして記録する
+    # 戻り値がDataFrameなら行数も記録する
+    with activate(trace), span(stage) as info:
+        result = fn(*args, **kwargs)
+        if isinstance(result, pd.DataFrame):
+            info["rows"] = len(result)
+        return result
+
+
+def write_log(record, path=None):
+    path = path or LOG_PATH
+    line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+    with _log_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            if os.path.getsize(path) > MAX_LOG_BYTES:
+                os.replace(path, path + ".1")
+        except FileNotFoundError:
+            pass
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+def summarize_log(path=None):
+    # 段階ごとの回数とp50/p95（ミリ秒）
+    path = path or LOG_PATH
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=["stage", "count", "p50_ms", "p95_ms"])
+    df = pd.read_json(path, lines=True)
+    grouped = df.groupby("stage")["duration_ms"]
+    return pd.DataFrame({
+        "count": grouped.size(),
+        "p50_ms": grouped.quantile(0.5),
+        "p95_ms": grouped.quantile(0.95),
+    }).reset_index()
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+# 日次のバリュエーション（PER・PBR・時価総額）
+# 株価の各営業日に、その日までに開示された最新の財務データをas-ofマージで銘柄ごとに結び付ける
+# 1銘柄でも全銘柄でも同じ処理で、行ごとのループは行わない
+
+# 財務データ（APIレスポンス形式）の列
+EPS_COLUMN = "EarningsPerShare"
+BPS_COLUMN = "BookValuePerShare"
+ISSUED_COLUMN = "NumberOfIssuedAndOutstandingSharesAtTheEndOfFiscalYearIncludingTreasuryStock"
+TREASURY_COLUMN = "NumberOfTreasuryStockAtTheEndOfFiscalYear"
+VALUATION_COLUMNS = ["Date", "Code", "Close", "PER", "PBR", "MarketCap"]
+
+
+def _cumulative_factor(df_price):
+    # 株式分割・併合の調整係数の累積積（分割後は1株あたりの値を係数で割り戻す）
+    return df_price["AdjustmentFactor"].fillna(1.0).groupby(df_price["Code"]).cumprod()
+
+
+def _numeric(df, col):
+    if col not in df.columns:
+        return pd.Series(np.nan, index=df.index)
+    return pd.to_numeric(df[col], errors="coerce")
+
+
+def per_share_values(df_st):
+    # 開示ごとの1株あたり利益・純資産と発行済株式数（自己株式を除く）
+    # EPSは通期の実績だけを使い、各値は空欄なら直前の開示の値を引き継ぐ
+    df = pd.DataFrame({
+        "Code": df_st["LocalCode"].astype(str),
+        "DisclosedDate": pd.to_datetime(df_st["DisclosedDate"]).astype("datetime64[ns]"),
+        "EPS": _numeric(df_st, EPS_COLUMN),
+        "BPS": _numeric(df_st, BPS_COLUMN),
+        "Shares": _numeric(df_st, ISSUED_COLUMN) - _numeric(df_st, TREASURY_COLUMN).fillna(0),
+    })
+    df.loc[df_st["TypeOfCurrentPeriod"].to_numpy() != "FY", "EPS"] = np.nan
+    return df.sort_values(["Code", "DisclosedDate"], kind="stable").reset_index(drop=True)
+
+
+def valuation_series(df_price, df_st):
+    # df_priceは日次株価（Date, Code, Close, AdjustmentFactor）、df_stは財務データ（APIレスポンス形式）
+    # 戻り値は Date, Code, Close, PER, PBR, MarketCap のDataFrame
+    if df_price.empty or df_st.empty:
+        return pd.DataFrame(columns=VALUATION_COLUMNS)
+    prices = pd.DataFrame({
+        "Date": pd.to_datetime(df_price["Date"]).astype("datetime64[ns]"),
+        "Code": df_price["Code"].astype(str),
+        "Close": df_price["Close"].astype("float64"),
+    })
+    prices["AdjustmentFactor"] = _numeric(df_price, "AdjustmentFactor")
+    prices = prices.sort_values(["Code", "Date"], kind="stable")
+    prices["CumFactor"] = _cumulative_factor(prices)
+    prices = prices.sort_values("Date", kind="stable")
+
+    values = per_share_values(df_st)
+    # 開示日時点の累積係数で割り戻し、分割前後で単位をそろえた値にしてから引き継ぐ
+    values = pd.merge_asof(
+        values.sort_values("DisclosedDate", kind="stable"),
+        prices[["Date", "Code", "CumFactor"]],
+        left_on="DisclosedDate",
+        right_on="Date",
+        by="Code",
+    ).drop(columns="Date")
+    values["CumFactor"] = values["CumFactor"].fillna(1.0)
+    values["EPS"] /= values["CumFactor"]
+    values["BPS"] /= values["CumFactor"]
+    values["Shares"] *= values["CumFactor"]
+    values = values.sort_values(["Code", "DisclosedDate"], kind="stable")
+    values[["EPS", "BPS", "Shares"]] = values.groupby("Code")[["EPS", "BPS", "Shares"]].ffill()
+    values = values.drop(columns="CumFactor").drop_duplicates(["Code", "DisclosedDate"], keep="last")
+
+    # 各営業日に、その日までに開示された最新の値を結び付ける
+    df = pd.merge_asof(
+        prices,
+        values.sort_values("DisclosedDate", kind="stable"),
+        left_on="Date",
+        right_on="DisclosedDate",
+        by="Code",
+    )
+    eps = df["EPS"] * df["CumFactor"]
+    bps = df["BPS"] * df["CumFactor"]
+    shares = df["Shares"] / df["CumFactor"]
+    # 赤字・債務超過のときは倍率を表示しない
+    df["PER"] = (df["Close"] / eps).where(eps > 0)
+    df["PBR"] = (df["Close"] / bps).where(bps > 0)
+    df["MarketCap"] = df["Close"] * shares
+    return df[VALUATION_COLUMNS].sort_values(["Code", "Date"], kind="stable").reset_index(drop=True)
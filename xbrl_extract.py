@@ -0,0 +1,187 @@
+import os
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from atomic_file import atomic_path
+from edinet_store import sec_code
+
+# EDINETの書類ZIPからキャッシュフロー・貸借対照表の主要項目を取り出す
+# ZIPは展開せずにXBRLインスタンスを直接読み、iterparseで1要素ずつ処理する（DOM全体を作らない）
+XBRL_DIR = os.path.join(os.path.dirname(__file__), "data", "edinet", "xbrl")
+FINANCIALS_PATH = os.path.join(os.path.dirname(__file__), "data", "edinet", "financials.parquet")
+
+# 財務諸表本表（日本基準: jppfs、IFRS: jpigp）の要素名 → 列名
+FACT_TAGS = {
+    "CashAndCashEquivalents": "CashAndCashEquivalents",
+    "CashAndCashEquivalentsIFRS": "CashAndCashEquivalents",
+    "NetCashProvidedByUsedInOperatingActivities": "OperatingCF",
+    "NetCashProvidedByUsedInOperatingActivitiesIFRS": "OperatingCF",
+    "NetCashProvidedByUsedInInvestingActivities": "InvestingCF",
+    "NetCashProvidedByUsedInInvestingActivitiesIFRS": "InvestingCF",
+    "NetCashProvidedByUsedInFinancingActivities": "FinancingCF",
+    "NetCashProvidedByUsedInFinancingActivitiesIFRS": "FinancingCF",
+    "Assets": "TotalAssets",
+    "AssetsIFRS": "TotalAssets",
+    "Liabilities": "TotalLiabilities",
+    "LiabilitiesIFRS": "TotalLiabilities",
+    "NetAssets": "NetAssets",
+    "EquityIFRS": "NetAssets",
+}
+FACT_NAMESPACES = ("/taxonomy/jppfs/", "/taxonomy/jpigp/")
+# 提出書類の基本情報（jpdei）
+DEI_TAGS = {
+    "EDINETCodeDEI": "edinetCode",
+    "SecurityCodeDEI": "secCode",
+    "TypeOfCurrentPeriodDEI": "TypeOfCurrentPeriod",
+    "CurrentFiscalYearEndDateDEI": "CurrentFiscalYearEndDate",
+    "CurrentPeriodEndDateDEI": "CurrentPeriodEndDate",
+}
+DEI_NAMESPACE = "/taxonomy/jpdei/"
+
+# コンテキストID（当期末・当期累計・前期末）。個別財務諸表は末尾に_NonConsolidatedMemberが付く
+CURRENT_INSTANT = ("CurrentYearInstant", "CurrentQuarterInstant", "InterimInstant")
+CURRENT_DURATION = ("CurrentYearDuration", "CurrentYTDDuration", "InterimDuration")
+PRIOR_INSTANT = ("Prior1YearInstant",)
+NON_CONSOLIDATED = "_NonConsolidatedMember"
+
+AMOUNT_COLUMNS = [
+    "CashAtBeginning", "OperatingCF", "InvestingCF", "FinancingCF", "CashAtEnd",
+    "TotalAssets", "TotalLiabilities", "NetAssets",
+]
+FINANCIAL_COLUMNS = [
+    "docID", "edinetCode", "secCode", "TypeOfCurrentPeriod", "CurrentFiscalYearEndDate", "CurrentPeriodEndDate",
+    "Consolidated",
+] + AMOUNT_COLUMNS
+
+
+def _split_tag(tag):
+    # "{名前空間}要素名" → (名前空間, 要素名)
+    if tag.startswith("{"):
+        ns, _, local = tag[1:].partition("}")
+        return ns, local
+    return "", tag
+
+
+def _period(context_ref):
+    # コンテキストIDを(期間の種類, 連結か)に分類する。セグメント別などの値は対象外
+    consolidated = not context_ref.endswith(NON_CONSOLIDATED)
+    base = context_ref if consolidated else context_ref[:-len(NON_CONSOLIDATED)]
+    if base in CURRENT_INSTANT:
+        return "current_instant", consolidated
+    if base in CURRENT_DURATION:
+        return "current_duration", consolidated
+    if base in PRIOR_INSTANT:
+        return "prior_instant", consolidated
+    return None, consolidated
+
+
+def _instance_name(zf):
+    # 本文のXBRLインスタンス（監査報告書のインスタンスは除く）
+    names = [n for n in zf.namelist() if n.startswith("XBRL/PublicDoc/") and n.endswith(".xbrl")]
+    return min(names) if names else None
+
+
+def parse_instance(f):
+    # XBRLインスタンスを1要素ずつ読み、対象の値だけを{(列名, 期間, 連結か): 値}に集める
+    dei = {}
+    facts = {}
+    depth = 0
+    root = None
+    for event, elem in ET.iterparse(f, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+        depth -= 1
+        ns, local = _split_tag(elem.tag)
+        if local in FACT_TAGS and any(s in ns for s in FACT_NAMESPACES):
+            period, consolidated = _period(elem.get("contextRef", ""))
+            text = (elem.text or "").strip()
+            if period and text:
+                facts[(FACT_TAGS[local], period, consolidated)] = float(text)
+        elif local in DEI_TAGS and DEI_NAMESPACE in ns:
+            dei[DEI_TAGS[local]] = (elem.text or "").strip() or None
+        # 読み終えた要素は捨ててメモリを一定に保つ
+        if depth == 1:
+            root.clear()
+    return dei, facts
+
+
+def _record(doc_id, dei, facts):
+    # 連結の値があれば連結、なければ個別の値で1件分のレコードを作る
+    consolidated = any(c for _, _, c in facts)
+    values = {(key, period): v for (key, period, c), v in facts.items() if c == consolidated}
+    record = dict.fromkeys(FINANCIAL_COLUMNS)
+    record.update(dei)
+    record.update({
+        "docID": doc_id,
+        "Consolidated": consolidated,
+        "CashAtBeginning": values.get(("CashAndCashEquivalents", "prior_instant")),
+        "OperatingCF": values.get(("OperatingCF", "current_duration")),
+        "InvestingCF": values.get(("InvestingCF", "current_duration")),
+        "FinancingCF": values.get(("FinancingCF", "current_duration")),
+        "CashAtEnd": values.get(("CashAndCashEquivalents", "current_instant")),
+        "TotalAssets": values.get(("TotalAssets", "current_instant")),
+        "TotalLiabilities": values.get(("TotalLiabilities", "current_instant")),
+        "NetAssets": values.get(("NetAssets", "current_instant")),
+    })
+    return record
+
+
+def extract_filing(path):
+    # 書類ZIP1件から1件分のレコードを返す（ファイル名の拡張子を除いた部分をdocIDとする）
+    doc_id = os.path.splitext(os.path.basename(path))[0]
+    with zipfile.ZipFile(path) as zf:
+        name = _instance_name(zf)
+        if name is None:
+            return None
+        with zf.open(name) as f:
+            dei, facts = parse_instance(f)
+    return _record(doc_id, dei, facts)
+
+
+def _extract_or_none(path):
+    # 壊れたZIP・XBRLは飛ばす（1件の失敗で全体を止めない）
+    try:
+        return extract_filing(path)
+    except (zipfile.BadZipFile, ET.ParseError, ValueError):
+        return None
+
+
+def extract_filings(paths, workers=None):
+    # 複数の書類ZIPをプロセスプールで並列に解析し、1書類1行のDataFrameを返す
+    paths = list(paths)
+    if not paths:
+        return pd.DataFrame(columns=FINANCIAL_COLUMNS)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunksize = max(1, len(paths) // ((workers or os.cpu_count() or 1) * 4))
+        records = [r for r in executor.map(_extract_or_none, paths, chunksize=chunksize) if r is not None]
+    df = pd.DataFrame(records, columns=FINANCIAL_COLUMNS)
+    df[AMOUNT_COLUMNS] = df[AMOUNT_COLUMNS].astype("float64")
+    return df
+
+
+def read_financials(code=None, path=None):
+    # 保存済みのレコードを読む（証券コードを指定するとその銘柄だけ）
+    path = path or FINANCIALS_PATH
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=FINANCIAL_COLUMNS)
+    if code is None:
+        return pd.read_parquet(path)
+    return pd.read_parquet(path, filters=[("secCode", "==", sec_code(code))])
+
+
+def save_financials(df, path=None):
+    # 既存のレコードと合わせて保存する（同じdocIDは新しい方を残す）
+    path = path or FINANCIALS_PATH
+    existing = read_financials(path=path)
+    if not existing.empty:
+        df = pd.concat([existing, df], ignore_index=True)
+    df = df.drop_duplicates(subset=["docID"], keep="last").reset_index(drop=True)
+    with atomic_path(path) as tmp_path:
+        df.to_parquet(tmp_path, index=False)
+    return len(df)